@@ -0,0 +1,83 @@
+"""
+Micro-batching benchmark for query embeddings (embedding_batcher.py).
+
+Simulates --clients concurrent worker threads that each embed queries back to
+back for --duration seconds, once per batching window, and reports queries/sec
+and p50/p99 latency. A window of 0 is the unbatched baseline where every
+thread calls model.encode on its own text.
+
+    python benchmarks/embedding_batching.py --clients 8 --windows 0 5 10 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_batcher import EmbeddingBatcher  # noqa: E402
+
+SAMPLE_QUERIES = [
+    "Historique des interventions sur le compresseur du frigo",
+    "La chambre froide ne descend pas en température",
+    "Défaut variateur sur le convoyeur de la ligne 2",
+    "Quelles sont les recommandations pour l'automate Siemens ?",
+    "Fuite d'huile sur la presse hydraulique",
+    "Alarme haute pression sur le groupe frigorifique",
+    "Capteur de niveau défectueux sur la cuve",
+    "Dernière intervention à l'abattoir",
+]
+
+
+def run_window(model, window_ms, clients, duration, batch_size):
+    batcher = EmbeddingBatcher(model, window_ms=window_ms, max_batch_size=batch_size)
+    latencies = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        local = []
+        while time.perf_counter() < stop_at:
+            text = f"{random.choice(SAMPLE_QUERIES)} {random.randint(0, 10**6)}"
+            start = time.perf_counter()
+            batcher.encode(text)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return len(latencies) / elapsed, statistics.median(latencies), p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 5, 10, 20])
+    args = parser.parse_args()
+
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+    model.encode(SAMPLE_QUERIES)  # Warm up
+
+    print(f"{'window (ms)':>12} {'queries/s':>10} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    for window_ms in args.windows:
+        qps, p50, p99 = run_window(model, window_ms, args.clients, args.duration, args.batch_size)
+        print(f"{window_ms:>12g} {qps:>10.1f} {p50 * 1000:>10.1f} {p99 * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import hashlib
+import json
+import re
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a query used in cache keys"""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+def history_digest(history_json):
+    """
+    Short digest of a conversation history as stored in Redis
+
+    Args:
+        history_json (bytes|str|None): Raw value of chat_history:<user_id>
+
+    Returns:
+        str: Empty string for a new conversation, a hex digest otherwise
+    """
+    if not history_json:
+        return ""
+    if isinstance(history_json, str):
+        history_json = history_json.encode()
+    return hashlib.sha256(history_json).hexdigest()[:16]
+
+
+def retrieval_cache_key(query, kb_version, where=None):
+    """Shared tier: query embedding and top-k hits, independent of the user"""
+    scope = json.dumps(where, sort_keys=True) if where else ""
+    digest = hashlib.sha256(f"{scope}:{normalize_query(query)}".encode()).hexdigest()
+    return f"retrieval:{kb_version}:{digest}"
+
+
+def answer_cache_key(query, history_digest_value, kb_version):
+    """Answer tier: depends on the query, the conversation so far and the knowledge base"""
+    digest = hashlib.sha256(f"{history_digest_value}:{normalize_query(query)}".encode()).hexdigest()
+    return f"answer:{kb_version}:{digest}"
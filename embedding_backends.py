@@ -0,0 +1,35 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# torch: the PyTorch SentenceTransformer (vectors currently stored in Chroma)
+# onnx:  ONNX Runtime, fp32 export of the same weights
+# int8:  ONNX Runtime with dynamically quantized int8 weights
+EMBEDDING_BACKENDS = ("torch", "onnx", "int8")
+
+# Quantized export shipped in the all-MiniLM-L6-v2 repository; override for other CPUs/models
+DEFAULT_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+def load_embedding_model(model_name="all-MiniLM-L6-v2", backend="torch", int8_file=DEFAULT_INT8_FILE):
+    """
+    Load a SentenceTransformer on the requested inference backend
+
+    Every backend exposes the same encode() API, so callers do not change.
+
+    Args:
+        model_name (str): Sentence-transformers model name
+        backend (str): One of EMBEDDING_BACKENDS
+        int8_file (str): ONNX file inside the model repository used for "int8"
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+
+    logger.info(f"Loading {model_name} with the {backend} embedding backend")
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+    return SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": int8_file})
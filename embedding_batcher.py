@@ -0,0 +1,80 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Coalesce concurrent encode() calls into a single model.encode batch.
+
+    The first text to arrive opens a window of window_ms milliseconds; every
+    text queued before the window closes (or until max_batch_size is reached)
+    is encoded in the same call and each caller gets its own vector back.
+    A window of 0 disables batching and encodes in the caller's thread.
+    """
+
+    def __init__(self, model, window_ms=10, max_batch_size=32):
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _start(self):
+        # Started lazily so a batcher created before a fork runs in each child
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def encode(self, text, timeout=None):
+        """
+        Encode one text, sharing the model call with concurrent callers
+
+        Args:
+            text (str): Text to embed
+            timeout (float): Seconds to wait for the batch result
+
+        Returns:
+            numpy.ndarray: Embedding vector
+        """
+        if self.window <= 0:
+            return self.model.encode(text)
+
+        self._start()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result(timeout=timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = self.model.encode(texts, batch_size=len(texts))
+        except Exception as e:
+            logger.error(f"Batched embedding failed for {len(texts)} texts: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
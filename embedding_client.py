@@ -0,0 +1,74 @@
+import logging
+import threading
+
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_SERVICE_URL = "http://127.0.0.1:5002"
+
+
+class EmbeddingClient:
+    """
+    Drop-in replacement for SentenceTransformer.encode backed by embedding_server.py.
+
+    If the service cannot be reached the model is loaded in-process (once)
+    and used instead, so callers keep working without the service.
+    """
+
+    def __init__(self, url=DEFAULT_EMBEDDING_SERVICE_URL, model_name="all-MiniLM-L6-v2", timeout=(1, 30), backend="torch"):
+        self.url = url.rstrip("/")
+        self.model_name = model_name
+        self.backend = backend
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._local_model = None
+        self._local_lock = threading.Lock()
+        self._service_up = True
+
+    def _get_local_model(self):
+        with self._local_lock:
+            if self._local_model is None:
+                from embedding_backends import load_embedding_model
+                logger.warning(f"Loading {self.model_name} in-process as embedding fallback")
+                self._local_model = load_embedding_model(self.model_name, self.backend)
+            return self._local_model
+
+    def service_available(self):
+        """Return True if the embedding service answers its health check"""
+        try:
+            # No session: this may run before a fork, and children must not share its connection
+            requests.get(f"{self.url}/health", timeout=self.timeout).raise_for_status()
+            return True
+        except requests.RequestException:
+            return False
+
+    def preload_local_model(self):
+        """Load the in-process fallback now, e.g. before forking so the children share it"""
+        self._get_local_model()
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        """
+        Encode a text or a list of texts
+
+        Returns:
+            numpy.ndarray: 1-D vector for a single text, 2-D array for a list
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        try:
+            response = self.session.post(f"{self.url}/encode", json={"texts": texts}, timeout=self.timeout)
+            response.raise_for_status()
+            vectors = np.asarray(response.json()["embeddings"], dtype=np.float32)
+            if not self._service_up:
+                logger.info("Embedding service reachable again")
+                self._service_up = True
+        except requests.RequestException as e:
+            if self._service_up:
+                logger.warning(f"Embedding service unavailable, using in-process model: {e}")
+                self._service_up = False
+            vectors = self._get_local_model().encode(texts, batch_size=batch_size, **kwargs)
+
+        return vectors[0] if single else vectors
@@ -0,0 +1,173 @@
+"""
+Shared embedding service: one resident SentenceTransformer per host.
+
+Django (ChromaDBManager), worker.py and the management commands reach it
+through embedding_client.EmbeddingClient instead of each loading their own
+copy of the model.
+
+    python embedding_server.py            # listens on 127.0.0.1:5002
+
+    POST /encode  {"texts": ["...", ...]}  ->  {"embeddings": [[...], ...]}
+    GET  /health
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from embedding_backends import load_embedding_model
+from embedding_batcher import EmbeddingBatcher
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# torch, onnx or int8 (see embedding_backends.py)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_HOST = os.environ.get("EMBEDDING_HOST", "127.0.0.1")
+EMBEDDING_PORT = int(os.environ.get("EMBEDDING_PORT", "5002"))
+EMBED_BATCH_WINDOW_MS = float(os.environ.get("EMBED_BATCH_WINDOW_MS", "10"))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "32"))
+# Requests in flight beyond this are refused with 503 instead of queueing without bound
+EMBED_MAX_PENDING = int(os.environ.get("EMBED_MAX_PENDING", "256"))
+# Number of recent texts whose vectors are kept in memory
+EMBED_CACHE_SIZE = int(os.environ.get("EMBED_CACHE_SIZE", "10000"))
+
+
+class EmbeddingCache:
+    """Thread-safe LRU of text -> embedding vector"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        with self._lock:
+            vector = self._entries.get(text)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(text)
+            self.hits += 1
+            return vector
+
+    def put(self, text, vector):
+        with self._lock:
+            self._entries[text] = vector
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class EmbeddingService:
+    """Batched, cached encode on top of a single model instance"""
+
+    def __init__(self, model):
+        self.model = model
+        self.batcher = EmbeddingBatcher(model, window_ms=EMBED_BATCH_WINDOW_MS, max_batch_size=EMBED_BATCH_SIZE)
+        self.cache = EmbeddingCache(EMBED_CACHE_SIZE)
+        self.slots = threading.BoundedSemaphore(EMBED_MAX_PENDING)
+
+    def encode(self, texts):
+        vectors = {}
+        missing = []
+        for text in texts:
+            if text in vectors or text in missing:
+                continue
+            vector = self.cache.get(text)
+            if vector is None:
+                missing.append(text)
+            else:
+                vectors[text] = vector
+
+        if len(missing) == 1:
+            # Single texts from concurrent callers share one model call
+            encoded = [self.batcher.encode(missing[0]).tolist()]
+        elif missing:
+            # Bulk requests are already a batch
+            encoded = self.model.encode(missing, batch_size=EMBED_BATCH_SIZE).tolist()
+        else:
+            encoded = []
+
+        for text, vector in zip(missing, encoded):
+            self.cache.put(text, vector)
+            vectors[text] = vector
+
+        return [vectors[text] for text in texts]
+
+
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": "not found"})
+            return
+        cache = self.service.cache
+        self._send_json(200, {
+            "status": "healthy",
+            "model": EMBEDDING_MODEL,
+            "backend": EMBEDDING_BACKEND,
+            "cache_entries": len(cache._entries),
+            "cache_hits": cache.hits,
+            "cache_misses": cache.misses,
+        })
+
+    def do_POST(self):
+        if self.path != "/encode":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        if not self.service.slots.acquire(blocking=False):
+            self._send_json(503, {"error": "embedding queue full"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            texts = json.loads(self.rfile.read(length)).get("texts", [])
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                self._send_json(400, {"error": "texts must be a list of strings"})
+                return
+            self._send_json(200, {"embeddings": self.service.encode(texts)})
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+        except Exception as e:
+            logger.error(f"Embedding request failed: {e}")
+            self._send_json(500, {"error": str(e)})
+        finally:
+            self.service.slots.release()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def main():
+    model = load_embedding_model(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+    EmbeddingRequestHandler.service = EmbeddingService(model)
+
+    server = ThreadingHTTPServer((EMBEDDING_HOST, EMBEDDING_PORT), EmbeddingRequestHandler)
+    server.daemon_threads = True
+    logger.info(f"Embedding service ({EMBEDDING_MODEL}, {EMBEDDING_BACKEND}) listening on {EMBEDDING_HOST}:{EMBEDDING_PORT}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Embedding service stopped by user")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import unicodedata
+from collections import deque
+
+# Redis keys written by form/chat_entities.py and read by the worker
+ENTITIES_KEY = "chat_entities"
+ENTITIES_VERSION_KEY = "chat_entities_version"
+
+
+def normalize_text(text):
+    """Lowercase and strip accents so 'Abattoir Dické' matches 'abattoir dicke'"""
+    text = unicodedata.normalize('NFD', text.lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher.
+
+    The automaton is built once from the patterns; a search then walks the
+    text a single time, so its cost depends on the text length and the
+    number of hits, not on how many patterns there are.
+    """
+
+    def __init__(self, patterns):
+        # State 0 is the root; each state has goto edges, a failure link and outputs
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._build_failure_links()
+
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """Yield (start, end, pattern) for every occurrence of every pattern"""
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern in self._output[state]:
+                yield index - len(pattern) + 1, index + 1, pattern
+
+
+class EntityMatcher:
+    """
+    Recognize known machine and filiale names in a chat message.
+
+    Names are compiled into one Aho-Corasick automaton per entity type and
+    only whole-word occurrences are kept, so a message is scanned once per
+    type regardless of how many names the catalog holds.
+    """
+
+    def __init__(self, machines=(), filiales=()):
+        self.machines = self._compile(machines)
+        self.filiales = self._compile(filiales)
+
+    @staticmethod
+    def _compile(names):
+        canonical = {normalize_text(name).strip(): name for name in names if name and name.strip()}
+        return AhoCorasick(canonical), canonical
+
+    @staticmethod
+    def _find(compiled, text):
+        automaton, canonical = compiled
+        found = []
+        for start, end, pattern in automaton.iter_matches(text):
+            # Whole words only: 'sna' must not match inside 'snack'
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if end < len(text) and text[end].isalnum():
+                continue
+            name = canonical[pattern]
+            if name not in found:
+                found.append(name)
+        return found
+
+    def match(self, text):
+        """
+        Return the machine and filiale names mentioned in text
+
+        Returns:
+            dict: {"machines": [...], "filiales": [...]} with the names as stored
+        """
+        normalized = normalize_text(text)
+        return {
+            "machines": self._find(self.machines, normalized),
+            "filiales": self._find(self.filiales, normalized),
+        }
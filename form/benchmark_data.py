@@ -0,0 +1,117 @@
+import random
+from datetime import timedelta
+from django.db.models import F
+from django.utils import timezone
+from .models import InterventionRequest, InterventionSearchTerm, SimilarIntervention, Machine, Filiale
+from .intervention_stats import invalidate_intervention_stats
+
+# Synthetic rows used by the database benchmarks. They are recognisable by
+# their reference prefix and removed by delete_benchmark_rows().
+BENCHMARK_REFERENCE_PREFIX = "BENCH-"
+BENCHMARK_NAME_PREFIX = "BENCH "
+
+MACHINE_COUNT = 200
+FILIALE_COUNT = 20
+
+OBJETS = [
+    "Défaut variateur convoyeur",
+    "Fuite d'huile presse hydraulique",
+    "Alarme haute pression groupe frigorifique",
+    "Remplacement roulement moteur",
+    "Capteur de niveau défectueux",
+    "Chambre froide hors température",
+    "Arrêt automate Siemens",
+    "Vibration anormale pompe centrifuge",
+    "Surchauffe compresseur à vis",
+    "Étalonnage balance de pesage",
+]
+
+DESCRIPTIONS = [
+    "Le technicien a constaté une usure prématurée des pièces et procédé au remplacement.",
+    "Intervention réalisée après plusieurs arrêts de production signalés par l'équipe de nuit.",
+    "Les paramètres du régulateur ont été corrigés et un essai de fonctionnement effectué.",
+    "Nettoyage complet, contrôle des connexions électriques et resserrage des borniers.",
+    "La vanne de sécurité était bloquée ; démontage, graissage et remise en service.",
+    "Mise à jour du programme et sauvegarde de la configuration sur le serveur.",
+]
+
+CONTACTS = ["Ahmed", "Benali", "Chaker", "Dridi", "Essid", "Ferchichi", "Gharbi", "Hamdi"]
+
+
+def _seed_entities():
+    machines = [
+        Machine.objects.get_or_create(name=f"{BENCHMARK_NAME_PREFIX}Machine {i}")[0]
+        for i in range(MACHINE_COUNT)
+    ]
+    filiales = [
+        Filiale.objects.get_or_create(name=f"{BENCHMARK_NAME_PREFIX}Filiale {i}")[0]
+        for i in range(FILIALE_COUNT)
+    ]
+    return machines, filiales
+
+
+def seed_benchmark_rows(total, batch_size=5000, seed=42):
+    """
+    Add synthetic interventions until `total` benchmark rows exist
+
+    Rows are written with bulk_create, so no signal runs (no ChromaDB job,
+    no search index: index them explicitly if needed).
+
+    Returns:
+        int: Number of rows created
+    """
+    rng = random.Random(seed)
+    machines, filiales = _seed_entities()
+    existing = InterventionRequest.objects.filter(reference__startswith=BENCHMARK_REFERENCE_PREFIX).count()
+    criticites = [value for value, _ in InterventionRequest.CRITICITE_CHOICES]
+    now = timezone.now()
+
+    created = 0
+    for start in range(existing, total, batch_size):
+        rows = []
+        for i in range(start, min(start + batch_size, total)):
+            machine = rng.choice(machines)
+            filiale = rng.choice(filiales)
+            rows.append(InterventionRequest(
+                reference=f"{BENCHMARK_REFERENCE_PREFIX}{i:08d}",
+                date_intervention=now - timedelta(minutes=rng.randint(0, 5 * 365 * 24 * 60)),
+                contact=rng.choice(CONTACTS),
+                machine_obj=machine,
+                filiale_obj=filiale,
+                machine=machine.name,
+                filiale=filiale.name,
+                intervenants=rng.choice(CONTACTS),
+                responsables=rng.choice(CONTACTS),
+                criticite=rng.choice(criticites),
+                diffuseur=rng.choice(CONTACTS),
+                objet=rng.choice(OBJETS),
+                description=" ".join(rng.sample(DESCRIPTIONS, 2)),
+            ))
+        InterventionRequest.objects.bulk_create(rows)
+        created += len(rows)
+
+    # auto_now_add stamps every row with the same instant: spread creation dates like real data
+    InterventionRequest.objects.filter(
+        reference__startswith=BENCHMARK_REFERENCE_PREFIX,
+        date_creation__gte=now,
+    ).update(date_creation=F('date_intervention'))
+    invalidate_intervention_stats()
+    return created
+
+
+def delete_benchmark_rows():
+    """
+    Remove every synthetic intervention, machine and filiale
+
+    Rows are deleted with plain DELETE statements: a regular delete() would
+    load a million instances and run the per-row signals (ChromaDB jobs, counters).
+    """
+    bench = {"intervention__reference__startswith": BENCHMARK_REFERENCE_PREFIX}
+    InterventionSearchTerm.objects.filter(**bench)._raw_delete('default')
+    SimilarIntervention.objects.filter(**bench)._raw_delete('default')
+    interventions = InterventionRequest.objects.filter(reference__startswith=BENCHMARK_REFERENCE_PREFIX)
+    deleted = interventions._raw_delete('default')
+    Machine.objects.filter(name__startswith=BENCHMARK_NAME_PREFIX).delete()
+    Filiale.objects.filter(name__startswith=BENCHMARK_NAME_PREFIX).delete()
+    invalidate_intervention_stats()
+    return deleted
@@ -0,0 +1,182 @@
+import atexit
+import json
+import logging
+import threading
+import time
+import redis
+from django.conf import settings
+from django.db.models import F
+from entity_matcher import EntityMatcher, ENTITIES_KEY, ENTITIES_VERSION_KEY
+from .models import Machine, Filiale
+
+logger = logging.getLogger(__name__)
+
+# Chat mentions are counted in Redis hashes (name -> pending increment), shared
+# by every Django process, and written to the database by whichever process
+# takes the flush lock, at most once per QUERY_COUNTER_FLUSH_INTERVAL seconds
+QUERY_COUNTER_FLUSH_INTERVAL = getattr(settings, 'CHAT_QUERY_COUNTER_FLUSH_INTERVAL', 30)
+QUERY_COUNTS_PREFIX = "chat_entity_queries"
+QUERY_COUNTS_FLUSH_LOCK = f"{QUERY_COUNTS_PREFIX}:flush_lock"
+
+# Without Redis the matcher cannot see renames made by other processes; rebuild it this often
+MATCHER_MAX_AGE = 60
+
+_redis_client = None
+
+_matcher = None
+_matcher_version = None
+_matcher_built_at = 0.0
+_matcher_lock = threading.Lock()
+
+
+
+def get_redis_client():
+    """Lazily connect to the Redis instance shared with the RAG worker"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(getattr(settings, 'REDIS_URL', 'redis://localhost:6379/0'))
+    return _redis_client
+
+
+def publish_chat_entities():
+    """
+    Publish the machine and filiale names used by the worker's entity recognizer
+
+    The version key is only bumped when the name lists actually change, so
+    saves that touch other fields do not make the worker rebuild its matcher.
+    """
+    payload = json.dumps({
+        "machines": sorted(Machine.objects.values_list('name', flat=True)),
+        "filiales": sorted(Filiale.objects.values_list('name', flat=True)),
+    })
+    
+    try:
+        client = get_redis_client()
+        current = client.get(ENTITIES_KEY)
+        if current is not None and current.decode() == payload:
+            return False
+        
+        pipe = client.pipeline()
+        pipe.set(ENTITIES_KEY, payload)
+        pipe.incr(ENTITIES_VERSION_KEY)
+        pipe.execute()
+        logger.info("Published machine and filiale names for the chatbot")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Failed to publish chatbot entities: {e}")
+        return False
+
+
+
+def get_entity_matcher():
+    """
+    Return the process-wide matcher, rebuilt when the machine/filiale tables change
+
+    Changes are detected through the version key bumped by publish_chat_entities,
+    so every Django process picks up names saved by any other process.
+    """
+    global _matcher, _matcher_version, _matcher_built_at
+    
+    try:
+        version = get_redis_client().get(ENTITIES_VERSION_KEY)
+    except Exception:
+        version = None
+    
+    with _matcher_lock:
+        stale = (
+            _matcher is None
+            or version != _matcher_version
+            or (version is None and time.monotonic() - _matcher_built_at > MATCHER_MAX_AGE)
+        )
+        if stale:
+            _matcher = EntityMatcher(
+                Machine.objects.values_list('name', flat=True),
+                Filiale.objects.values_list('name', flat=True),
+            )
+            _matcher_version = version
+            _matcher_built_at = time.monotonic()
+        return _matcher
+
+
+def _apply_query_counts(model, counts):
+    """Add {name: increment} to query_counter, with one UPDATE per distinct increment (usually just +1)"""
+    names_by_increment = {}
+    for name, increment in counts.items():
+        names_by_increment.setdefault(increment, []).append(name)
+    for increment, names in names_by_increment.items():
+        model.objects.filter(name__in=names).update(query_counter=F('query_counter') + increment)
+
+
+def record_entity_queries(entities):
+    """
+    Count a chat mention of each matched machine and filiale
+
+    Increments go to Redis with one pipelined round trip (HINCRBY), so they
+    survive process restarts and are shared by forked workers. The same round
+    trip tries the flush lock; the process that gets it writes every pending
+    count to the database with bulk F() updates. Without Redis, the counters
+    are updated in the database directly.
+    """
+    mentioned = {"machines": entities.get("machines", []), "filiales": entities.get("filiales", [])}
+    if not any(mentioned.values()):
+        return
+    
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        for kind, names in mentioned.items():
+            for name in names:
+                pipe.hincrby(f"{QUERY_COUNTS_PREFIX}:{kind}", name, 1)
+        pipe.set(QUERY_COUNTS_FLUSH_LOCK, 1, nx=True, ex=QUERY_COUNTER_FLUSH_INTERVAL)
+        due = pipe.execute()[-1]
+    except Exception as e:
+        logger.warning(f"Redis unavailable, updating chat query counters directly: {e}")
+        for kind, model in (("machines", Machine), ("filiales", Filiale)):
+            if mentioned[kind]:
+                try:
+                    _apply_query_counts(model, {name: 1 for name in mentioned[kind]})
+                except Exception as e:
+                    logger.error(f"Failed to update chat query counters for {kind}: {e}")
+        return
+    
+    if due:
+        flush_entity_queries()
+
+
+def flush_entity_queries():
+    """Write the query counters pending in Redis to the database"""
+    try:
+        client = get_redis_client()
+    except Exception as e:
+        logger.error(f"Failed to flush chat query counters: {e}")
+        return
+    
+    for kind, model in (("machines", Machine), ("filiales", Filiale)):
+        key = f"{QUERY_COUNTS_PREFIX}:{kind}"
+        try:
+            # Read and clear atomically: increments made meanwhile go to the next flush
+            pipe = client.pipeline(transaction=True)
+            pipe.hgetall(key)
+            pipe.delete(key)
+            pending = pipe.execute()[0]
+        except Exception as e:
+            logger.error(f"Failed to read chat query counters for {kind}: {e}")
+            continue
+        if not pending:
+            continue
+        
+        counts = {name.decode(): int(increment) for name, increment in pending.items()}
+        try:
+            _apply_query_counts(model, counts)
+        except Exception as e:
+            logger.error(f"Failed to flush chat query counters for {kind}, keeping them for the next flush: {e}")
+            try:
+                pipe = client.pipeline(transaction=False)
+                for name, increment in counts.items():
+                    pipe.hincrby(key, name, increment)
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"Lost chat query counters for {kind}: {e}")
+
+
+atexit.register(flush_entity_queries)
@@ -1,26 +1,68 @@
+import hashlib
 import logging
-from chromadb import PersistentClient
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+import multiprocessing
+import threading
+from collections import deque
+from embedding_client import EmbeddingClient, DEFAULT_EMBEDDING_SERVICE_URL
 import uuid
 from datetime import datetime
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
 import os
+import redis
+from kb_version import bump_kb_version, count_embeds, get_embed_counts, get_kb_version
 
 logger = logging.getLogger(__name__)
 
+# Seconds the collection counts are cached; they are also keyed by kb_version,
+# so any add, update or delete made through the manager invalidates them
+STATS_CACHE_TTL = getattr(settings, 'CHROMADB_STATS_CACHE_TTL', 60)
+
 class ChromaDBManager:
-    """Manager class for ChromaDB operations"""
+    """Manager class for ChromaDB operations
+
+    Nothing is opened at import time: the ChromaDB client, the embedding
+    client and Redis are set up on the first vector operation (or an explicit
+    warm_up()), so management commands that never touch the knowledge base
+    start instantly.
+    """
     
     def __init__(self):
         self.client = None
         self.collection = None
         self.model = None
-        self.initialize_chromadb()
+        self.redis_client = None
+        self._initialized = False
+        self._init_lock = threading.Lock()
+    
+    def _ensure_initialized(self):
+        """Initialize ChromaDB and Redis once, on first use, even when called from several threads"""
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.initialize_chromadb()
+            self.initialize_redis()
+            self._initialized = True
+    
+    def warm_up(self):
+        """
+        Initialize eagerly, e.g. when a web worker boots, so the first request does not pay for it
+        
+        Returns:
+            bool: True if ChromaDB is available
+        """
+        return self.is_available()
     
     def initialize_chromadb(self):
         """Initialize ChromaDB client and collection"""
         try:
+            # Imported here: loading chromadb alone takes seconds
+            from chromadb import PersistentClient
+            from chromadb.config import Settings
+            
             # Initialize ChromaDB client
             chroma_path = getattr(settings, 'CHROMADB_PATH', '../chroma_data')
             self.client = PersistentClient(
@@ -40,8 +82,8 @@ class ChromaDBManager:
                 )
                 logger.info("Created new ChromaDB collection")
             
-            # Initialize the embedding model
-            self.model = SentenceTransformer("all-MiniLM-L6-v2")
+            # Embed through the shared embedding service (in-process fallback)
+            self.model = self._create_embedding_client()
             logger.info("ChromaDB Manager initialized successfully")
             
         except Exception as e:
@@ -50,8 +92,40 @@ class ChromaDBManager:
             self.collection = None
             self.model = None
     
+    def _create_embedding_client(self):
+        """Build the client for the shared embedding service"""
+        return EmbeddingClient(
+            getattr(settings, 'EMBEDDING_SERVICE_URL', DEFAULT_EMBEDDING_SERVICE_URL),
+            model_name="all-MiniLM-L6-v2",
+            backend=getattr(settings, 'EMBEDDING_BACKEND', 'torch'),
+        )
+    
+    def initialize_redis(self):
+        """Connect to the Redis instance shared with the RAG gateway and worker"""
+        try:
+            self.redis_client = redis.Redis.from_url(getattr(settings, 'REDIS_URL', 'redis://localhost:6379/0'))
+            self.redis_client.ping()
+        except Exception as e:
+            logger.warning(f"Redis not available, cached chatbot answers will not be invalidated: {e}")
+            self.redis_client = None
+    
+    def _knowledge_base_changed(self):
+        """Bump the knowledge-base version so answers cached before this change are no longer served"""
+        version = bump_kb_version(self.redis_client)
+        if version is not None:
+            logger.info(f"Knowledge base version is now {version}")
+    
+    def _count_embeds(self, outcome, n=1):
+        """Count encodes performed vs. skipped because the intervention text was unchanged"""
+        count_embeds(self.redis_client, outcome, n)
+    
+    def get_embed_counts(self):
+        """Return the embed counters of all processes, e.g. {"performed": 120, "skipped": 30}"""
+        return get_embed_counts(self.redis_client)
+    
     def is_available(self):
-        """Check if ChromaDB is available"""
+        """Check if ChromaDB is available, initializing it on first call"""
+        self._ensure_initialized()
         return all([self.client, self.collection, self.model])
     
     def embed_intervention(self, intervention):
@@ -73,20 +147,7 @@ class ChromaDBManager:
             embedding = self.model.encode(intervention_text).tolist()
             
             # Create metadata
-            metadata = {
-                "source": f"Intervention_{intervention.reference}",
-                "type": "intervention",
-                "reference": intervention.reference,
-                "criticite": intervention.criticite,
-                "machine": intervention.machine,
-                "filiale": intervention.filiale,
-                "contact": intervention.contact,
-                "date_intervention": intervention.date_intervention.isoformat(),
-                "date_creation": intervention.date_creation.isoformat(),
-                "year": intervention.date_intervention.year,
-                "month": intervention.date_intervention.month,
-                "has_recommendations": bool(intervention.recommandations),
-            }
+            metadata = self._intervention_metadata(intervention, intervention_text)
             
             # Generate unique ID for this intervention
             doc_id = f"intervention_{intervention.reference}_{intervention.pk}"
@@ -99,6 +160,8 @@ class ChromaDBManager:
                 ids=[doc_id]
             )
             
+            self._count_embeds("performed")
+            self._knowledge_base_changed()
             logger.info(f"Successfully embedded intervention {intervention.reference} into ChromaDB")
             return True
             
@@ -110,8 +173,15 @@ class ChromaDBManager:
         """
         Update an existing intervention in ChromaDB
         
+        The encode and write are skipped when the intervention text is unchanged
+        since it was last embedded (same text_digest in the stored metadata).
+        
         Args:
             intervention: InterventionRequest instance
+            
+        Returns:
+            str or bool: "embedded" if the embedding was (re)written, "unchanged"
+                if it was skipped, False on failure
         """
         if not self.is_available():
             logger.error("ChromaDB not available for updating")
@@ -122,34 +192,29 @@ class ChromaDBManager:
             
             # Check if document exists
             try:
-                existing = self.collection.get(ids=[doc_id])
+                existing = self.collection.get(ids=[doc_id], include=["metadatas"])
                 if not existing['ids']:
                     # Document doesn't exist, create it
-                    return self.embed_intervention(intervention)
+                    return self.embed_intervention(intervention) and "embedded"
             except Exception:
                 # Document doesn't exist, create it
-                return self.embed_intervention(intervention)
+                return self.embed_intervention(intervention) and "embedded"
             
-            # Update existing document
+            # Update existing document, unless only non-textual fields changed
             intervention_text = self._create_intervention_text(intervention)
+            stored_metadata = existing['metadatas'][0] or {}
+            if stored_metadata.get("text_digest") == self._text_digest(intervention_text):
+                self._count_embeds("skipped")
+                logger.debug(f"Intervention {intervention.reference} unchanged, embedding skipped")
+                return "unchanged"
+            
             embedding = self.model.encode(intervention_text).tolist()
             
-            metadata = {
-                "source": f"Intervention_{intervention.reference}",
-                "type": "intervention",
-                "reference": intervention.reference,
-                "criticite": intervention.criticite,
-                "machine": intervention.machine,
-                "filiale": intervention.filiale,
-                "contact": intervention.contact,
-                "date_intervention": intervention.date_intervention.isoformat(),
-                "date_creation": intervention.date_creation.isoformat(),
+            metadata = self._intervention_metadata(intervention, intervention_text)
+            metadata.update({
                 "date_modification": intervention.date_modification.isoformat(),
-                "year": intervention.date_intervention.year,
-                "month": intervention.date_intervention.month,
-                "has_recommendations": bool(intervention.recommandations),
                 "updated": True,
-            }
+            })
             
             # Update in ChromaDB
             self.collection.update(
@@ -159,13 +224,131 @@ class ChromaDBManager:
                 metadatas=[metadata]
             )
             
+            self._count_embeds("performed")
+            self._knowledge_base_changed()
             logger.info(f"Successfully updated intervention {intervention.reference} in ChromaDB")
-            return True
+            return "embedded"
             
         except Exception as e:
             logger.error(f"Failed to update intervention {intervention.reference}: {e}")
             return False
     
+    def embed_many(self, queryset, chunk_size=256, skip_existing=False, workers=1, progress=None):
+        """
+        Embed a queryset of interventions in bulk
+        
+        Rows are walked by primary key (keyset, no OFFSET). Each chunk is loaded
+        with its documents prefetched, encoded in one call and written with one
+        upsert. With workers > 1, chunks are built and encoded in forked
+        processes; ChromaDB is only ever written from this process.
+        
+        Args:
+            queryset: InterventionRequest queryset
+            chunk_size (int): Interventions per encode / upsert
+            skip_existing (bool): Leave interventions already in ChromaDB untouched
+            workers (int): Number of processes building and encoding chunks
+            progress (callable): Called with the running counts after each chunk
+            
+        Returns:
+            dict: Number of interventions embedded, skipped and failed
+        """
+        counts = {"embedded": 0, "skipped": 0, "errors": 0}
+        if not self.is_available():
+            logger.error("ChromaDB not available for embedding")
+            return counts
+        
+        model = queryset.model
+        
+        def pk_chunks():
+            for rows in self._iter_keyset_chunks(queryset, chunk_size):
+                if skip_existing:
+                    ids = [f"intervention_{reference}_{pk}" for pk, reference in rows]
+                    existing = set(self.collection.get(ids=ids, include=[])['ids'])
+                    counts["skipped"] += len(existing)
+                    rows = [(pk, reference) for pk, reference in rows
+                            if f"intervention_{reference}_{pk}" not in existing]
+                if rows:
+                    yield [pk for pk, _ in rows]
+        
+        def write(pks, chunk):
+            if chunk is None:
+                counts["errors"] += len(pks)
+            else:
+                ids, embeddings, documents, metadatas = chunk
+                try:
+                    self.collection.upsert(
+                        ids=ids,
+                        embeddings=embeddings,
+                        documents=documents,
+                        metadatas=metadatas,
+                    )
+                    counts["embedded"] += len(ids)
+                    self._count_embeds("performed", len(ids))
+                except Exception as e:
+                    logger.error(f"Failed to upsert {len(ids)} interventions: {e}")
+                    counts["errors"] += len(ids)
+            if progress:
+                progress(counts)
+        
+        if workers <= 1:
+            for pks in pk_chunks():
+                write(*self._prepare_chunk(model, pks))
+        else:
+            # Children must open their own database connections
+            connections.close_all()
+            pool = multiprocessing.get_context("fork").Pool(workers, initializer=_init_embed_worker)
+            # Chunks (ORM queries, skip_existing lookups) are listed here, in the
+            # calling thread, and handed to the pool one by one: imap() would
+            # consume pk_chunks() from the pool's task-handler thread
+            pending = deque()
+            try:
+                for pks in pk_chunks():
+                    pending.append(pool.apply_async(_prepare_chunk_in_worker, ((model, pks),)))
+                    if len(pending) >= 2 * workers:
+                        write(*pending.popleft().get())
+                while pending:
+                    write(*pending.popleft().get())
+            finally:
+                pool.close()
+                pool.join()
+        
+        if counts["embedded"]:
+            self._knowledge_base_changed()
+        logger.info(f"Bulk embedding finished: {counts}; embeds so far: {self.get_embed_counts()}")
+        return counts
+    
+    def _iter_keyset_chunks(self, queryset, chunk_size):
+        """Yield lists of (pk, reference) from a queryset, paginated on the primary key"""
+        rows = queryset.order_by('pk').values_list('pk', 'reference')
+        last_pk = None
+        while True:
+            page = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+            chunk = list(page[:chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_pk = chunk[-1][0]
+    
+    def _prepare_chunk(self, model, pks):
+        """
+        Build the ChromaDB rows for one chunk of interventions
+        
+        Returns:
+            tuple: (pks, (ids, embeddings, documents, metadatas)), or (pks, None) on failure
+        """
+        try:
+            interventions = model.objects.filter(pk__in=pks).prefetch_related('documents').order_by('pk')
+            ids, documents, metadatas = [], [], []
+            for intervention in interventions:
+                ids.append(f"intervention_{intervention.reference}_{intervention.pk}")
+                documents.append(self._create_intervention_text(intervention))
+                metadatas.append(self._intervention_metadata(intervention, documents[-1]))
+            embeddings = self.model.encode(documents).tolist() if documents else []
+            return pks, (ids, embeddings, documents, metadatas)
+        except Exception as e:
+            logger.error(f"Failed to prepare {len(pks)} interventions for embedding: {e}")
+            return pks, None
+    
     def delete_intervention(self, intervention):
         """
         Delete an intervention from ChromaDB
@@ -183,6 +366,7 @@ class ChromaDBManager:
             # Delete from ChromaDB
             self.collection.delete(ids=[doc_id])
             
+            self._knowledge_base_changed()
             logger.info(f"Successfully deleted intervention {intervention.reference} from ChromaDB")
             return True
             
@@ -190,6 +374,37 @@ class ChromaDBManager:
             logger.error(f"Failed to delete intervention {intervention.reference}: {e}")
             return False
     
+    def _text_digest(self, text):
+        """Stable digest of an intervention text, used to detect unchanged interventions"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def _intervention_metadata(self, intervention, intervention_text):
+        """
+        Build the ChromaDB metadata stored with an intervention
+        
+        Args:
+            intervention: InterventionRequest instance
+            intervention_text (str): Text embedded for the intervention
+            
+        Returns:
+            dict: Metadata
+        """
+        return {
+            "source": f"Intervention_{intervention.reference}",
+            "type": "intervention",
+            "reference": intervention.reference,
+            "criticite": intervention.criticite,
+            "machine": intervention.machine,
+            "filiale": intervention.filiale,
+            "contact": intervention.contact,
+            "date_intervention": intervention.date_intervention.isoformat(),
+            "date_creation": intervention.date_creation.isoformat(),
+            "year": intervention.date_intervention.year,
+            "month": intervention.date_intervention.month,
+            "has_recommendations": bool(intervention.recommandations),
+            "text_digest": self._text_digest(intervention_text),
+        }
+    
     def _create_intervention_text(self, intervention):
         """
         Create a comprehensive text representation of the intervention for embedding
@@ -261,25 +476,91 @@ class ChromaDBManager:
             logger.error(f"Failed to search interventions: {e}")
             return {"documents": [], "metadatas": [], "distances": []}
     
+    def search_many(self, queries, n_results=5, where=None):
+        """
+        Search similar interventions for several queries at once
+        
+        All queries are encoded in one batch and sent as one multi-embedding
+        ChromaDB query, instead of one encode and one query per text.
+        
+        Args:
+            queries (iterable): Search queries
+            n_results (int): Number of results per query
+            where (dict): ChromaDB metadata filter, interventions only by default
+            
+        Returns:
+            list: One dict per query, in input order, with flat "ids",
+                "documents", "metadatas" and "distances" lists
+        """
+        queries = list(queries)
+        empty = [{"ids": [], "documents": [], "metadatas": [], "distances": []} for _ in queries]
+        if not queries:
+            return empty
+        if not self.is_available():
+            logger.error("ChromaDB not available for search")
+            return empty
+        
+        try:
+            query_embeddings = self.model.encode(queries).tolist()
+            
+            results = self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"],
+                where=where if where is not None else {"type": "intervention"}
+            )
+            
+            return [
+                {
+                    "ids": results["ids"][i],
+                    "documents": results["documents"][i],
+                    "metadatas": results["metadatas"][i],
+                    "distances": results["distances"][i],
+                }
+                for i in range(len(queries))
+            ]
+            
+        except Exception as e:
+            logger.error(f"Failed to search interventions for {len(queries)} queries: {e}")
+            return empty
+    
     def get_collection_stats(self):
-        """Get statistics about the ChromaDB collection"""
+        """Get statistics about the ChromaDB collection (cached, see STATS_CACHE_TTL)"""
         if not self.is_available():
             return {"total": 0, "interventions": 0, "error": "ChromaDB not available"}
         
+        cache_key = f"chromadb_stats:{get_kb_version(self.redis_client)}"
         try:
-            # Get total count
-            total_count = self.collection.count()
+            counts = cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f"Cache unavailable, counting ChromaDB documents: {e}")
+            counts = None
+        
+        try:
+            if counts is None:
+                # Get total count
+                total_count = self.collection.count()
+                
+                # Get intervention count: IDs only, no metadata or documents
+                intervention_results = self.collection.get(
+                    where={"type": "intervention"},
+                    include=[]
+                )
+                intervention_count = len(intervention_results['ids']) if intervention_results['ids'] else 0
+                
+                counts = {"total": total_count, "interventions": intervention_count}
+                try:
+                    cache.set(cache_key, counts, STATS_CACHE_TTL)
+                except Exception as e:
+                    logger.warning(f"Failed to cache ChromaDB statistics: {e}")
             
-            # Get intervention count
-            intervention_results = self.collection.get(
-                where={"type": "intervention"},
-                include=["metadatas"]
-            )
-            intervention_count = len(intervention_results['ids']) if intervention_results['ids'] else 0
+            embed_counts = self.get_embed_counts()
             
             return {
-                "total": total_count,
-                "interventions": intervention_count,
+                "total": counts["total"],
+                "interventions": counts["interventions"],
+                "embeds_performed": embed_counts["performed"],
+                "embeds_skipped": embed_counts["skipped"],
                 "available": True
             }
             
@@ -287,5 +568,17 @@ class ChromaDBManager:
             logger.error(f"Failed to get collection stats: {e}")
             return {"total": 0, "interventions": 0, "error": str(e)}
 
-# Global instance
+
+def _init_embed_worker():
+    """Pool initializer for embed_many: don't share the parent's HTTP connections"""
+    chromadb_manager.model = chromadb_manager._create_embedding_client()
+
+
+def _prepare_chunk_in_worker(args):
+    """Pool task for embed_many"""
+    model, pks = args
+    return chromadb_manager._prepare_chunk(model, pks)
+
+
+# Global instance (initialized lazily, see ChromaDBManager._ensure_initialized)
 chromadb_manager = ChromaDBManager()
\ No newline at end of file
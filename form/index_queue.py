@@ -0,0 +1,204 @@
+import json
+import logging
+import time
+from django.conf import settings
+from django.db import transaction
+from .chat_entities import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Redis keys of the ChromaDB index queue. Jobs are keyed by intervention pk:
+# the sorted set holds the time each job becomes due, the hash its payload
+# (latest action wins), and claimed jobs sit in the in-flight hash until the
+# indexer confirms them, so a crash never loses a job.
+INDEX_QUEUE_KEY = "chroma_index:queue"
+INDEX_PAYLOADS_KEY = "chroma_index:payloads"
+INDEX_IN_FLIGHT_KEY = "chroma_index:in_flight"
+INDEX_FAILED_KEY = "chroma_index:failed"
+# When each queued job was first queued, to bound how long debouncing can delay it
+INDEX_FIRST_QUEUED_KEY = "chroma_index:first_queued"
+
+# Saves of the same intervention within this many seconds are indexed once
+INDEX_DEBOUNCE_SECONDS = getattr(settings, 'CHROMA_INDEX_DEBOUNCE_SECONDS', 2)
+# ...but a job is never pushed back more than this many seconds after it was first queued
+INDEX_DEBOUNCE_MAX_WAIT = getattr(settings, 'CHROMA_INDEX_DEBOUNCE_MAX_WAIT', 30)
+INDEX_MAX_ATTEMPTS = getattr(settings, 'CHROMA_INDEX_MAX_ATTEMPTS', 5)
+INDEX_RETRY_BASE_DELAY = getattr(settings, 'CHROMA_INDEX_RETRY_BASE_DELAY', 5)
+INDEX_RETRY_MAX_DELAY = 300
+
+# Store the payload ARGV[2] of job ARGV[1] queued at ARGV[3]; it becomes due after
+# the debounce ARGV[4], but no later than ARGV[5] seconds after it was first queued
+_ENQUEUE_SCRIPT = """
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('HSETNX', KEYS[3], ARGV[1], ARGV[3])
+local first = tonumber(redis.call('HGET', KEYS[3], ARGV[1]))
+local due = math.min(tonumber(ARGV[3]) + tonumber(ARGV[4]), first + tonumber(ARGV[5]))
+redis.call('ZADD', KEYS[1], due, ARGV[1])
+return due
+"""
+
+# Atomically move up to ARGV[2] jobs due at ARGV[1] from the queue to in-flight
+_CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+local jobs = {}
+for _, member in ipairs(due) do
+    local payload = redis.call('HGET', KEYS[2], member)
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('HDEL', KEYS[2], member)
+    redis.call('HDEL', KEYS[4], member)
+    if payload then
+        redis.call('HSET', KEYS[3], member, payload)
+        table.insert(jobs, payload)
+    end
+end
+return jobs
+"""
+
+
+def enqueue_index_job(pk, action="upsert", reference=None, attempts=0):
+    """
+    Queue a ChromaDB index job for one intervention
+
+    A job already queued for the same intervention is replaced and its due
+    time pushed back, so bursts of saves are coalesced into one job. The
+    push-back stops INDEX_DEBOUNCE_MAX_WAIT seconds after the first save, so
+    an intervention saved over and over is still indexed.
+
+    Returns:
+        bool: True if the job was queued
+    """
+    payload = json.dumps({"pk": pk, "action": action, "reference": reference, "attempts": attempts})
+    try:
+        enqueue = get_redis_client().register_script(_ENQUEUE_SCRIPT)
+        enqueue(
+            keys=[INDEX_QUEUE_KEY, INDEX_PAYLOADS_KEY, INDEX_FIRST_QUEUED_KEY],
+            args=[str(pk), payload, time.time(), INDEX_DEBOUNCE_SECONDS, INDEX_DEBOUNCE_MAX_WAIT],
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Failed to queue index job for intervention {pk}: {e}")
+        return False
+
+
+def apply_index_job(job):
+    """
+    Write one index job to ChromaDB and refresh the affected similar-intervention lists
+
+    Returns:
+        bool: True on success
+    """
+    from .chromadb_manager import chromadb_manager
+    from .models import InterventionRequest
+    from .similar_interventions import lists_to_repair_after_delete, refresh_similar_interventions, repair_lists
+
+    if job["action"] == "delete":
+        to_repair = lists_to_repair_after_delete(job["pk"], job["reference"])
+        intervention = InterventionRequest(pk=job["pk"], reference=job["reference"])
+        if not chromadb_manager.delete_intervention(intervention):
+            return False
+        repair_lists(to_repair)
+        return True
+
+    intervention = InterventionRequest.objects.prefetch_related('documents').filter(pk=job["pk"]).first()
+    if intervention is None:
+        # Deleted since it was queued: its delete job takes care of ChromaDB
+        return True
+    outcome = chromadb_manager.update_intervention(intervention)
+    if not outcome:
+        return False
+    if outcome == "embedded":
+        # Same text, same embedding: the neighbour lists cannot have changed
+        refresh_similar_interventions(intervention)
+    return True
+
+
+def schedule_index(intervention, action="upsert"):
+    """
+    Queue an intervention for (re)indexing or deletion once the current transaction commits
+
+    Args:
+        intervention: InterventionRequest instance
+        action (str): "upsert" or "delete"
+    """
+    pk = intervention.pk
+    reference = intervention.reference
+
+    def enqueue():
+        if not enqueue_index_job(pk, action, reference):
+            # Fallback when Redis is down: index in-process, as before the queue existed
+            logger.warning(f"Index queue unavailable, indexing intervention {reference} in-process")
+            try:
+                apply_index_job({"pk": pk, "action": action, "reference": reference})
+            except Exception as e:
+                logger.error(f"Failed to index intervention {reference}: {e}")
+
+    transaction.on_commit(enqueue)
+
+
+def claim_due_jobs(limit=50):
+    """Claim up to `limit` due jobs for the indexer and return their payloads"""
+    claim = get_redis_client().register_script(_CLAIM_SCRIPT)
+    payloads = claim(
+        keys=[INDEX_QUEUE_KEY, INDEX_PAYLOADS_KEY, INDEX_IN_FLIGHT_KEY, INDEX_FIRST_QUEUED_KEY],
+        args=[time.time(), limit],
+    )
+    return [json.loads(payload) for payload in payloads]
+
+
+def complete_job(job):
+    """Confirm an indexed job"""
+    get_redis_client().hdel(INDEX_IN_FLIGHT_KEY, str(job["pk"]))
+
+
+def retry_job(job, error):
+    """
+    Requeue a failed job with exponential backoff, or park it in the failed list
+
+    A retry never overrides a newer job queued for the same intervention
+    meanwhile: that job supersedes it.
+    """
+    client = get_redis_client()
+    member = str(job["pk"])
+    attempts = job.get("attempts", 0) + 1
+
+    pipe = client.pipeline()
+    pipe.hdel(INDEX_IN_FLIGHT_KEY, member)
+    if attempts >= INDEX_MAX_ATTEMPTS:
+        pipe.lpush(INDEX_FAILED_KEY, json.dumps({**job, "attempts": attempts, "error": str(error)}))
+        logger.error(f"Giving up indexing intervention {job['pk']} after {attempts} attempts: {error}")
+    else:
+        delay = min(INDEX_RETRY_BASE_DELAY * 2 ** (attempts - 1), INDEX_RETRY_MAX_DELAY)
+        pipe.hsetnx(INDEX_PAYLOADS_KEY, member, json.dumps({**job, "attempts": attempts}))
+        pipe.zadd(INDEX_QUEUE_KEY, {member: time.time() + delay}, nx=True)
+        logger.warning(f"Indexing intervention {job['pk']} failed, retry {attempts} in {delay}s: {error}")
+    pipe.execute()
+
+
+def requeue_in_flight():
+    """
+    Put back jobs claimed by an indexer that stopped before confirming them
+
+    Returns:
+        int: Number of jobs requeued
+    """
+    client = get_redis_client()
+    in_flight = client.hgetall(INDEX_IN_FLIGHT_KEY)
+    now = time.time()
+    for member, payload in in_flight.items():
+        pipe = client.pipeline()
+        pipe.hsetnx(INDEX_PAYLOADS_KEY, member, payload)
+        pipe.zadd(INDEX_QUEUE_KEY, {member: now}, nx=True)
+        pipe.hdel(INDEX_IN_FLIGHT_KEY, member)
+        pipe.execute()
+    return len(in_flight)
+
+
+def get_queue_stats():
+    """Return the number of queued, in-flight and failed index jobs"""
+    client = get_redis_client()
+    pipe = client.pipeline()
+    pipe.zcard(INDEX_QUEUE_KEY)
+    pipe.hlen(INDEX_IN_FLIGHT_KEY)
+    pipe.llen(INDEX_FAILED_KEY)
+    queued, in_flight, failed = pipe.execute()
+    return {"queued": queued, "in_flight": in_flight, "failed": failed}
@@ -0,0 +1,94 @@
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from .models import InterventionRequest, Machine, Filiale
+
+logger = logging.getLogger(__name__)
+
+# The dashboard counters live in the cache as one key per counter, so the
+# signal handlers can adjust them with atomic incr/decr instead of recounting.
+# The TTL is only a safety net for writes that bypass signals (queryset.update, bulk_create).
+STATS_CACHE_PREFIX = "intervention_stats"
+STATS_CACHE_TTL = getattr(settings, 'INTERVENTION_STATS_CACHE_TTL', 3600)
+STATS_FIELDS = ['total'] + [value for value, _ in InterventionRequest.CRITICITE_CHOICES] + ['machines', 'filiales']
+
+
+def _cache_key(field):
+    return f"{STATS_CACHE_PREFIX}:{field}"
+
+
+def criticite_breakdown(queryset):
+    """
+    Count interventions per criticité with one conditional-aggregation query
+
+    Args:
+        queryset: InterventionRequest queryset (filters are kept)
+
+    Returns:
+        dict: "total" plus one count per criticité value
+    """
+    aggregates = {'total': Count('id')}
+    for value, _ in InterventionRequest.CRITICITE_CHOICES:
+        aggregates[value] = Count('id', filter=Q(criticite=value))
+    return queryset.aggregate(**aggregates)
+
+
+def _compute_stats():
+    stats = criticite_breakdown(InterventionRequest.objects.all())
+    stats['machines'] = Machine.objects.count()
+    stats['filiales'] = Filiale.objects.count()
+    return stats
+
+
+def get_intervention_stats():
+    """
+    Return the dashboard counters, from the cache when possible
+
+    Returns:
+        dict: total, one count per criticité, machines and filiales
+    """
+    try:
+        cached = cache.get_many([_cache_key(field) for field in STATS_FIELDS])
+        if len(cached) == len(STATS_FIELDS):
+            return {field: cached[_cache_key(field)] for field in STATS_FIELDS}
+    except Exception as e:
+        logger.warning(f"Cache unavailable, computing dashboard statistics: {e}")
+        return _compute_stats()
+
+    stats = _compute_stats()
+    try:
+        cache.set_many({_cache_key(field): value for field, value in stats.items()}, STATS_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to cache dashboard statistics: {e}")
+    return stats
+
+
+def invalidate_intervention_stats():
+    """Drop the cached counters; the next read recomputes them"""
+    try:
+        cache.delete_many([_cache_key(field) for field in STATS_FIELDS])
+    except Exception as e:
+        logger.error(f"Failed to invalidate dashboard statistics: {e}")
+
+
+def adjust_intervention_stats(deltas):
+    """
+    Apply counter changes to the cached statistics
+
+    If the counters are not cached (expired, never read), nothing is adjusted:
+    the next read computes them from the database anyway.
+
+    Args:
+        deltas (dict): Field name -> increment, e.g. {"total": 1, "haute": 1}
+    """
+    try:
+        for field, delta in deltas.items():
+            if delta:
+                cache.incr(_cache_key(field), delta)
+    except ValueError:
+        # A counter is missing: drop the others too so they are recomputed together
+        invalidate_intervention_stats()
+    except Exception as e:
+        logger.error(f"Failed to adjust dashboard statistics: {e}")
+        invalidate_intervention_stats()
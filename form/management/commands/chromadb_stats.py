@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from form.chromadb_manager import chromadb_manager
 from form.models import InterventionRequest
+from form.index_queue import get_queue_stats
 
 class Command(BaseCommand):
     help = 'Show ChromaDB collection statistics'
@@ -46,6 +47,21 @@ class Command(BaseCommand):
                     self.style.WARNING(f'⚠ {extra} extra intervention documents in ChromaDB')
                 )
             
+            self.stdout.write(
+                f'Embeds: {stats["embeds_performed"]} performed, '
+                f'{stats["embeds_skipped"]} skipped (text unchanged)'
+            )
+            
+            # Show pending index jobs (written by run_chroma_indexer)
+            try:
+                queue = get_queue_stats()
+                self.stdout.write(
+                    f'\nIndex queue: {queue["queued"]} queued, '
+                    f'{queue["in_flight"]} in progress, {queue["failed"]} failed'
+                )
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f'\nIndex queue unavailable: {e}'))
+            
             # Show criticality breakdown
             self.stdout.write('\nCriticality breakdown in Django:')
             for criticite, label in InterventionRequest.CRITICITE_CHOICES:
@@ -0,0 +1,124 @@
+import itertools
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from form.models import InterventionRequest
+from form.views import filter_interventions
+from form.benchmark_data import BENCHMARK_NAME_PREFIX, seed_benchmark_rows, delete_benchmark_rows
+
+FILTER_VALUES = {
+    'criticite': 'haute',
+    'filiale': f'{BENCHMARK_NAME_PREFIX}Filiale 0',
+    'machine': f'{BENCHMARK_NAME_PREFIX}Machine 0',
+}
+
+class Command(BaseCommand):
+    help = (
+        'Seed N interventions and record EXPLAIN plans and timings of every dashboard filter '
+        'combination (run before and after migrating to compare)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100000,
+            help='Number of synthetic interventions'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Measurements per query (best one is kept)'
+        )
+        parser.add_argument(
+            '--label',
+            default='run',
+            help='Name of this run in the output, e.g. "before" or "after"'
+        )
+        parser.add_argument(
+            '--output',
+            help='JSON file the plans and timings are appended to'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the synthetic rows after the benchmark'
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        results = []
+
+        try:
+            self.stdout.write(f'Seeding up to {options["rows"]} interventions...')
+            seed_benchmark_rows(options['rows'])
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE TABLE {InterventionRequest._meta.db_table}')
+
+            self.stdout.write(f'{"filters":<32} {"mode":<7} {"page (ms)":>10} {"count (ms)":>11} {"rows":>9}')
+            for size in range(len(FILTER_VALUES) + 1):
+                for combination in itertools.combinations(FILTER_VALUES, size):
+                    for mode in ('string', 'fk'):
+                        if mode == 'fk' and not set(combination) & {'filiale', 'machine'}:
+                            continue
+                        queryset = self.build_queryset(combination, mode)
+                        page_ms = self.measure(lambda: list(queryset[:11]), repeat)
+                        count_ms = self.measure(queryset.count, repeat)
+                        result = {
+                            'label': options['label'],
+                            'filters': list(combination),
+                            'mode': mode,
+                            'first_page_ms': round(page_ms, 2),
+                            'count_ms': round(count_ms, 2),
+                            'rows': queryset.count(),
+                            'explain': queryset[:11].explain(),
+                        }
+                        results.append(result)
+                        name = '+'.join(combination) or '(none)'
+                        self.stdout.write(
+                            f'{name:<32} {mode:<7} {page_ms:>10.2f} {count_ms:>11.2f} {result["rows"]:>9}'
+                        )
+        finally:
+            if not options['keep']:
+                deleted = delete_benchmark_rows()
+                self.stdout.write(f'Removed {deleted} synthetic interventions')
+
+        if options['output']:
+            try:
+                with open(options['output']) as f:
+                    previous = json.load(f)
+            except (FileNotFoundError, ValueError):
+                previous = []
+            with open(options['output'], 'w') as f:
+                json.dump(previous + results, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Plans and timings written to {options["output"]}'))
+        else:
+            for result in results:
+                self.stdout.write(f'\n{"+".join(result["filters"]) or "(none)"} [{result["mode"]}]')
+                self.stdout.write(result['explain'])
+
+    def build_queryset(self, combination, mode):
+        """
+        The dashboard query for one filter combination: string filtering (the
+        original query) or the dashboard's own filter_interventions (FK ids)
+        """
+        queryset = InterventionRequest.objects.order_by('-date_creation', '-id')
+        if mode == 'fk':
+            filters = {field: FILTER_VALUES.get(field) if field in combination else 'all'
+                       for field in ('criticite', 'filiale', 'machine')}
+            return filter_interventions(
+                queryset, '', filters['criticite'], filters['filiale'], filters['machine']
+            )
+        for field in combination:
+            queryset = queryset.filter(**{field: FILTER_VALUES[field]})
+        return queryset
+
+    def measure(self, run, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
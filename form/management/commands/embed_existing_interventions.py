@@ -10,8 +10,14 @@ class Command(BaseCommand):
         parser.add_argument(
             '--batch-size',
             type=int,
-            default=10,
-            help='Number of interventions to process in each batch'
+            default=256,
+            help='Number of interventions to encode and write in each batch'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes building and encoding batches in parallel'
         )
         parser.add_argument(
             '--force',
@@ -21,6 +27,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         batch_size = options['batch_size']
+        workers = options['workers']
         force = options['force']
         
         self.stdout.write(
@@ -34,7 +41,7 @@ class Command(BaseCommand):
             return
         
         # Get all interventions
-        interventions = InterventionRequest.objects.all().order_by('date_creation')
+        interventions = InterventionRequest.objects.all()
         total_count = interventions.count()
         
         if total_count == 0:
@@ -45,47 +52,31 @@ class Command(BaseCommand):
         
         self.stdout.write(f'Found {total_count} interventions to process...')
         
-        success_count = 0
-        error_count = 0
-        
-        # Process in batches
-        for i in range(0, total_count, batch_size):
-            batch = interventions[i:i + batch_size]
-            
-            self.stdout.write(f'Processing batch {i//batch_size + 1} ({len(batch)} interventions)...')
-            
-            for intervention in batch:
-                try:
-                    if force:
-                        # Force update (will create if doesn't exist)
-                        success = chromadb_manager.update_intervention(intervention)
-                    else:
-                        # Try to embed (will skip if already exists)
-                        success = chromadb_manager.embed_intervention(intervention)
-                    
-                    if success:
-                        success_count += 1
-                        self.stdout.write(f'  ✓ {intervention.reference}')
-                    else:
-                        error_count += 1
-                        self.stdout.write(f'  ✗ {intervention.reference} (failed)')
-                        
-                except Exception as e:
-                    error_count += 1
-                    self.stdout.write(f'  ✗ {intervention.reference} (error: {e})')
-            
-            # Show progress
-            processed = min(i + batch_size, total_count)
+        def show_progress(counts):
+            processed = counts['embedded'] + counts['skipped'] + counts['errors']
             self.stdout.write(f'Progress: {processed}/{total_count} interventions processed')
         
+        # Keyset-paginated batches: one encode and one upsert per batch.
+        # Without --force, interventions already in ChromaDB are skipped.
+        counts = chromadb_manager.embed_many(
+            interventions,
+            chunk_size=batch_size,
+            skip_existing=not force,
+            workers=workers,
+            progress=show_progress,
+        )
+        success_count = counts['embedded']
+        error_count = counts['errors']
+        
         # Final summary
         self.stdout.write('\n' + '='*50)
         self.stdout.write(
             self.style.SUCCESS(f'Embedding completed!')
         )
         self.stdout.write(f'Successfully embedded: {success_count}')
+        self.stdout.write(f'Already embedded (skipped): {counts["skipped"]}')
         self.stdout.write(f'Errors: {error_count}')
-        self.stdout.write(f'Total processed: {success_count + error_count}')
+        self.stdout.write(f'Total processed: {success_count + counts["skipped"] + error_count}')
         
         # Show collection stats
         stats = chromadb_manager.get_collection_stats()
@@ -94,6 +85,9 @@ class Command(BaseCommand):
             self.stdout.write(f'  Total documents: {stats["total"]}')
             self.stdout.write(f'  Interventions: {stats["interventions"]}')
         
+        if success_count > 0:
+            self.stdout.write('\nTo refresh similar interventions, run: python manage.py rebuild_similar_interventions')
+        
         if error_count > 0:
             self.stdout.write(
                 self.style.WARNING(f'\n{error_count} interventions failed to embed. Check logs for details.')
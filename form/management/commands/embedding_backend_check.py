@@ -0,0 +1,98 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from embedding_backends import EMBEDDING_BACKENDS, DEFAULT_INT8_FILE, load_embedding_model
+from form.chromadb_manager import chromadb_manager
+
+class Command(BaseCommand):
+    help = 'Compare embedding backends: cosine drift against stored vectors and CPU throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends',
+            nargs='+',
+            choices=EMBEDDING_BACKENDS,
+            default=list(EMBEDDING_BACKENDS),
+            help='Backends to evaluate'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=500,
+            help='Number of stored documents to re-encode'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=32,
+            help='Batch size for the throughput measurement'
+        )
+        parser.add_argument(
+            '--int8-file',
+            type=str,
+            default=DEFAULT_INT8_FILE,
+            help='Quantized ONNX file used by the int8 backend'
+        )
+
+    def handle(self, *args, **options):
+        if not chromadb_manager.is_available():
+            self.stdout.write(
+                self.style.ERROR('ChromaDB is not available. Please check your configuration.')
+            )
+            return
+        
+        # Vectors currently stored in the collection are the parity reference
+        stored = chromadb_manager.collection.get(
+            limit=options['limit'],
+            include=['documents', 'embeddings']
+        )
+        documents = stored['documents']
+        reference = np.asarray(stored['embeddings'], dtype=np.float32)
+        
+        if not documents:
+            self.stdout.write(self.style.WARNING('The collection is empty.'))
+            return
+        
+        reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+        batch_size = options['batch_size']
+        
+        self.stdout.write(f'Evaluating {len(documents)} stored documents, batch size {batch_size}')
+        self.stdout.write('='*50)
+        
+        for backend in options['backends']:
+            try:
+                model = load_embedding_model('all-MiniLM-L6-v2', backend, int8_file=options['int8_file'])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'{backend}: could not load ({e})'))
+                continue
+            
+            model.encode(documents[:batch_size], batch_size=batch_size)  # Warm up
+            
+            batch_latencies = []
+            vectors = []
+            start = time.perf_counter()
+            for i in range(0, len(documents), batch_size):
+                batch_start = time.perf_counter()
+                vectors.append(model.encode(documents[i:i + batch_size], batch_size=batch_size))
+                batch_latencies.append(time.perf_counter() - batch_start)
+            elapsed = time.perf_counter() - start
+            
+            # Single-text latency is what a chat query pays
+            single_latencies = []
+            for text in documents[:50]:
+                single_start = time.perf_counter()
+                model.encode(text)
+                single_latencies.append(time.perf_counter() - single_start)
+            
+            vectors = np.vstack(vectors).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            cosine = np.sum(vectors * reference, axis=1)
+            drift = 1 - cosine
+            
+            self.stdout.write(self.style.SUCCESS(f'\n{backend}'))
+            self.stdout.write(f'  Throughput: {len(documents) / elapsed:.1f} texts/s')
+            self.stdout.write(f'  Batch latency p50: {np.percentile(batch_latencies, 50) * 1000:.1f} ms')
+            self.stdout.write(f'  Single text latency p50: {np.percentile(single_latencies, 50) * 1000:.1f} ms')
+            self.stdout.write(f'  Cosine drift mean: {drift.mean():.6f}')
+            self.stdout.write(f'  Cosine drift p99: {np.percentile(drift, 99):.6f}')
+            self.stdout.write(f'  Cosine drift max: {drift.max():.6f}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from form.chat_entities import publish_chat_entities
+
+class Command(BaseCommand):
+    help = 'Publish machine and filiale names to Redis for the RAG worker entity filter'
+
+    def handle(self, *args, **options):
+        if publish_chat_entities():
+            self.stdout.write(
+                self.style.SUCCESS('Machine and filiale names published')
+            )
+        else:
+            self.stdout.write('Names unchanged or Redis unavailable (see logs)')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from form.models import InterventionRequest, InterventionSearchTerm
+from form.search import SEARCH_FIELDS, index_interventions
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of all interventions'
+
+    def handle(self, *args, **options):
+        InterventionSearchTerm.objects.all().delete()
+
+        interventions = InterventionRequest.objects.only('pk', *SEARCH_FIELDS).iterator(chunk_size=2000)
+        written = index_interventions(interventions)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Search index rebuilt: {written} terms')
+        )
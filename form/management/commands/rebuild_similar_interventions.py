@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from form.models import InterventionRequest
+from form.chromadb_manager import chromadb_manager
+from form.similar_interventions import rebuild_similar_interventions
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed similar interventions of every intervention'
+
+    def handle(self, *args, **options):
+        if not chromadb_manager.is_available():
+            self.stdout.write(
+                self.style.ERROR('ChromaDB is not available. Please check your configuration.')
+            )
+            return
+
+        count = rebuild_similar_interventions(InterventionRequest.objects.all())
+        self.stdout.write(
+            self.style.SUCCESS(f'Similar interventions recomputed for {count} interventions')
+        )
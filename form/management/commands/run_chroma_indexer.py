@@ -0,0 +1,76 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from form.chromadb_manager import chromadb_manager
+from form.index_queue import apply_index_job, claim_due_jobs, complete_job, retry_job, requeue_in_flight
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run the ChromaDB indexer: the single process writing queued intervention changes to ChromaDB'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when no job is due'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Maximum number of jobs claimed at once'
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval']
+        batch_size = options['batch_size']
+
+        if not chromadb_manager.is_available():
+            self.stdout.write(
+                self.style.ERROR('ChromaDB is not available. Please check your configuration.')
+            )
+            return
+
+        requeued = requeue_in_flight()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} unfinished jobs')
+
+        self.stdout.write(self.style.SUCCESS('ChromaDB indexer started'))
+
+        try:
+            while True:
+                try:
+                    jobs = claim_due_jobs(batch_size)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'Cannot read the index queue: {e}'))
+                    time.sleep(poll_interval)
+                    continue
+
+                if not jobs:
+                    time.sleep(poll_interval)
+                    continue
+
+                for job in jobs:
+                    self.process_job(job)
+                logger.info(f"Applied {len(jobs)} index jobs; embeds so far: {chromadb_manager.get_embed_counts()}")
+
+        except KeyboardInterrupt:
+            counts = chromadb_manager.get_embed_counts()
+            self.stdout.write(
+                f'ChromaDB indexer stopped ({counts["performed"]} embeds performed, '
+                f'{counts["skipped"]} skipped since the counters were created)'
+            )
+
+    def process_job(self, job):
+        """Apply one index job; failures are retried with backoff"""
+        try:
+            if apply_index_job(job):
+                complete_job(job)
+                self.stdout.write(f'  ✓ {job["action"]} {job["reference"]}')
+            else:
+                retry_job(job, 'ChromaDB operation failed (see logs)')
+
+        except Exception as e:
+            retry_job(job, e)
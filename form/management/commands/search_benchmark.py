@@ -0,0 +1,87 @@
+import time
+from django.core.management.base import BaseCommand
+from form.models import InterventionRequest
+from form.benchmark_data import BENCHMARK_REFERENCE_PREFIX, seed_benchmark_rows, delete_benchmark_rows
+from form.search import SEARCH_FIELDS, fulltext_search, icontains_search, index_interventions
+
+DEFAULT_QUERIES = [
+    "fuite huile",
+    "défaut variateur",
+    "compresseur",
+    "chambre froide température",
+    "Hamdi",
+    "BENCH-0000042",
+]
+
+class Command(BaseCommand):
+    help = 'Compare the substring (icontains) and full-text searches on seeded interventions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[100000, 1000000],
+            help='Number of synthetic interventions for each measurement'
+        )
+        parser.add_argument(
+            '--queries',
+            nargs='+',
+            default=DEFAULT_QUERIES,
+            help='Search queries to time'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Measurements per query (best one is kept)'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the synthetic rows after the benchmark'
+        )
+
+    def handle(self, *args, **options):
+        queries = options['queries']
+        repeat = options['repeat']
+
+        try:
+            for rows in sorted(options['rows']):
+                self.stdout.write(self.style.SUCCESS(f'\nSeeding up to {rows} interventions...'))
+                seed_benchmark_rows(rows)
+                pending = InterventionRequest.objects.filter(
+                    reference__startswith=BENCHMARK_REFERENCE_PREFIX,
+                    search_terms__isnull=True,
+                ).only('pk', *SEARCH_FIELDS)
+                index_interventions(pending.iterator(chunk_size=2000))
+
+                total = InterventionRequest.objects.count()
+                self.stdout.write(f'{total} interventions in the table')
+                self.stdout.write(f'{"query":<30} {"icontains (ms)":>15} {"full-text (ms)":>15} {"hits":>9} {"hits (ft)":>10}')
+
+                for query in queries:
+                    base = InterventionRequest.objects.all()
+                    like_ms, like_hits = self.measure(lambda: icontains_search(base, query), repeat)
+                    fulltext_ms, fulltext_hits = self.measure(lambda: fulltext_search(base, query), repeat)
+                    self.stdout.write(
+                        f'{query[:30]:<30} {like_ms:>15.1f} {fulltext_ms:>15.1f} {like_hits:>9} {fulltext_hits:>10}'
+                    )
+        finally:
+            if not options['keep']:
+                deleted = delete_benchmark_rows()
+                self.stdout.write(f'\nRemoved {deleted} synthetic interventions')
+
+    def measure(self, build_queryset, repeat):
+        """Time a dashboard-like use: count the matches and fetch the first page"""
+        best = float('inf')
+        hits = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset = build_queryset()
+            if queryset is None:
+                return 0.0, 0
+            hits = queryset.count()
+            list(queryset[:10])
+            best = min(best, time.perf_counter() - start)
+        return best * 1000, hits
@@ -0,0 +1,84 @@
+import itertools
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from form.chromadb_manager import chromadb_manager
+
+class Command(BaseCommand):
+    help = 'Compare per-query search cost: search_similar_interventions in a loop vs. one search_many call'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-sizes',
+            type=int,
+            nargs='+',
+            default=[1, 10, 100],
+            help='Number of queries per measurement'
+        )
+        parser.add_argument(
+            '--n-results',
+            type=int,
+            default=5,
+            help='Results per query'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Measurements per batch size (best one is kept)'
+        )
+
+    def handle(self, *args, **options):
+        if not chromadb_manager.is_available():
+            self.stdout.write(
+                self.style.ERROR('ChromaDB is not available. Please check your configuration.')
+            )
+            return
+
+        batch_sizes = options['batch_sizes']
+        n_results = options['n_results']
+        repeat = options['repeat']
+
+        # Use stored intervention texts as queries (objet line), like a dashboard would
+        stored = chromadb_manager.collection.get(
+            where={"type": "intervention"},
+            include=["documents"],
+            limit=max(batch_sizes)
+        )
+        texts = [doc.split('\n')[1] if '\n' in doc else doc for doc in stored['documents']]
+        if not texts:
+            self.stdout.write(self.style.WARNING('No interventions in ChromaDB to build queries from.'))
+            return
+
+        # Warm up the embedding client and the collection
+        chromadb_manager.search_many(texts[:1], n_results)
+
+        # The embedding server caches encodes by text: every timed run gets its own
+        # query texts (unique suffix), so neither method is measured on cache hits
+        nonce = uuid.uuid4().hex[:8]
+        runs = itertools.count()
+
+        def fresh(queries):
+            run = f"{nonce}-{next(runs)}"
+            return [f"{query} [{run}]" for query in queries]
+
+        self.stdout.write(f'{"batch":>6} {"loop (ms/query)":>16} {"search_many (ms/query)":>23} {"speed-up":>9}')
+        for batch_size in batch_sizes:
+            queries = [texts[i % len(texts)] for i in range(batch_size)]
+
+            loop_best = many_best = float('inf')
+            for _ in range(repeat):
+                loop_queries = fresh(queries)
+                start = time.perf_counter()
+                for query in loop_queries:
+                    chromadb_manager.search_similar_interventions(query, n_results)
+                loop_best = min(loop_best, time.perf_counter() - start)
+
+                many_queries = fresh(queries)
+                start = time.perf_counter()
+                chromadb_manager.search_many(many_queries, n_results)
+                many_best = min(many_best, time.perf_counter() - start)
+
+            loop_ms = loop_best * 1000 / batch_size
+            many_ms = many_best * 1000 / batch_size
+            self.stdout.write(f'{batch_size:>6} {loop_ms:>16.2f} {many_ms:>23.2f} {loop_ms / many_ms:>8.1f}x')
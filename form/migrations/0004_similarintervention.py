@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-16 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form', '0003_technician'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarIntervention',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Rang')),
+                ('distance', models.FloatField(verbose_name='Distance')),
+                ('intervention', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='form.interventionrequest', verbose_name='Intervention')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='form.interventionrequest', verbose_name='Intervention similaire')),
+            ],
+            options={
+                'verbose_name': 'Intervention similaire',
+                'verbose_name_plural': 'Interventions similaires',
+                'ordering': ['intervention', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('intervention', 'rank'), name='unique_similar_rank')],
+            },
+        ),
+    ]
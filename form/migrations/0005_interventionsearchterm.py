@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-16 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form', '0004_similarintervention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterventionSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Terme')),
+                ('weight', models.PositiveIntegerField(verbose_name='Poids')),
+                ('intervention', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='form.interventionrequest', verbose_name='Intervention')),
+            ],
+            options={
+                'verbose_name': 'Terme de recherche',
+                'verbose_name_plural': 'Termes de recherche',
+                'constraints': [models.UniqueConstraint(fields=('term', 'intervention'), name='unique_search_term')],
+            },
+        ),
+    ]
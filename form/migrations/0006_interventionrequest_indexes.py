@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-16 12:00
+
+from django.db import migrations, models
+
+
+def link_machines_and_filiales(apps, schema_editor):
+    """Fill machine_obj / filiale_obj from the text fields where they are still empty"""
+    InterventionRequest = apps.get_model('form', 'InterventionRequest')
+    Machine = apps.get_model('form', 'Machine')
+    Filiale = apps.get_model('form', 'Filiale')
+
+    for field, model in (('machine', Machine), ('filiale', Filiale)):
+        unlinked = InterventionRequest.objects.filter(**{f'{field}_obj__isnull': True}).exclude(**{field: ''})
+        for name in unlinked.values_list(field, flat=True).distinct():
+            obj, _ = model.objects.get_or_create(name=name)
+            unlinked.filter(**{field: name}).update(**{f'{field}_obj': obj})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form', '0005_interventionsearchterm'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_machines_and_filiales, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='interventionrequest',
+            options={'ordering': ['-date_creation', '-id'], 'verbose_name': "Demande d'intervention", 'verbose_name_plural': "Demandes d'intervention"},
+        ),
+        migrations.AddIndex(
+            model_name='interventionrequest',
+            index=models.Index(fields=['date_creation', 'id'], name='interv_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interventionrequest',
+            index=models.Index(fields=['criticite', 'date_creation', 'id'], name='interv_crit_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interventionrequest',
+            index=models.Index(fields=['machine_obj', 'date_creation', 'id'], name='interv_machine_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interventionrequest',
+            index=models.Index(fields=['filiale_obj', 'date_creation', 'id'], name='interv_filiale_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interventionrequest',
+            index=models.Index(fields=['filiale_obj', 'criticite', 'date_creation', 'id'], name='interv_fil_crit_date_idx'),
+        ),
+    ]
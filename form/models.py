@@ -119,7 +119,16 @@ class InterventionRequest(models.Model):
     class Meta:
         verbose_name = "Demande d'intervention"
         verbose_name_plural = "Demandes d'intervention"
-        ordering = ['-date_creation']
+        ordering = ['-date_creation', '-id']
+        indexes = [
+            # Tri par défaut du tableau de bord et pagination par curseur
+            models.Index(fields=['date_creation', 'id'], name='interv_date_idx'),
+            # Filtres du tableau de bord, suivis du même tri
+            models.Index(fields=['criticite', 'date_creation', 'id'], name='interv_crit_date_idx'),
+            models.Index(fields=['machine_obj', 'date_creation', 'id'], name='interv_machine_date_idx'),
+            models.Index(fields=['filiale_obj', 'date_creation', 'id'], name='interv_filiale_date_idx'),
+            models.Index(fields=['filiale_obj', 'criticite', 'date_creation', 'id'], name='interv_fil_crit_date_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.reference:
@@ -172,4 +181,57 @@ class DocumentIntervention(models.Model):
         verbose_name_plural = "Documents d'intervention"
     
     def __str__(self):
-        return f"{self.nom_fichier} - {self.intervention.reference}"
\ No newline at end of file
+        return f"{self.nom_fichier} - {self.intervention.reference}"
+
+
+class InterventionSearchTerm(models.Model):
+    """Index inversé de la recherche plein texte : un terme normalisé par intervention"""
+    
+    term = models.CharField(max_length=64, verbose_name="Terme")
+    intervention = models.ForeignKey(
+        InterventionRequest,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name="Intervention"
+    )
+    weight = models.PositiveIntegerField(verbose_name="Poids")
+    
+    class Meta:
+        verbose_name = "Terme de recherche"
+        verbose_name_plural = "Termes de recherche"
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'intervention'], name='unique_search_term'),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} -> {self.intervention_id}"
+
+
+class SimilarIntervention(models.Model):
+    """Interventions les plus proches d'une intervention, précalculées par l'indexeur ChromaDB"""
+    
+    intervention = models.ForeignKey(
+        InterventionRequest,
+        on_delete=models.CASCADE,
+        related_name='similar_links',
+        verbose_name="Intervention"
+    )
+    similar = models.ForeignKey(
+        InterventionRequest,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Intervention similaire"
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name="Rang")
+    distance = models.FloatField(verbose_name="Distance")
+    
+    class Meta:
+        verbose_name = "Intervention similaire"
+        verbose_name_plural = "Interventions similaires"
+        ordering = ['intervention', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['intervention', 'rank'], name='unique_similar_rank'),
+        ]
+    
+    def __str__(self):
+        return f"{self.intervention_id} -> {self.similar_id} ({self.rank})"
\ No newline at end of file
@@ -0,0 +1,221 @@
+import base64
+import hashlib
+import json
+import logging
+import math
+from datetime import datetime
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+# Seconds a filtered result count is reused by the listing pages
+COUNT_CACHE_TTL = 60
+
+
+def encode_cursor(values, number):
+    """Encode the key of the last row before a page, and that page's number"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps({"after": payload, "page": number}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (key values, page number), or (None, 1) for a missing or invalid cursor"""
+    if not cursor:
+        return None, 1
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return data["after"], max(int(data["page"]), 1)
+    except (ValueError, KeyError, TypeError):
+        logger.warning(f"Ignoring invalid pagination cursor: {cursor!r}")
+        return None, 1
+
+
+def cached_count(queryset, params, ttl=COUNT_CACHE_TTL):
+    """
+    Count a filtered queryset at most once per `ttl` seconds for the same filters
+
+    Args:
+        queryset: Filtered queryset
+        params (dict): The filters that produced it (used as the cache key)
+    """
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    key = f"listing_count:{queryset.model._meta.label_lower}:{digest}"
+    try:
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, ttl)
+        return count
+    except Exception as e:
+        logger.warning(f"Cache unavailable, counting without it: {e}")
+        return queryset.count()
+
+
+class KeysetPage:
+    """One page of a KeysetPaginator, usable like a Django Page in templates"""
+
+    def __init__(self, object_list, number, next_cursor, previous_cursor, page_links, count, per_page):
+        self.object_list = object_list
+        self.number = number
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.page_links = page_links
+        self.count = count
+        self.num_pages = max(math.ceil(count / per_page), 1) if count is not None else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def to_dict(self):
+        """Pagination metadata for JSON responses"""
+        return {
+            "page": self.number,
+            "next_cursor": self.next_cursor,
+            "previous_cursor": self.previous_cursor,
+            "has_next": self.has_next(),
+            "has_previous": self.has_previous(),
+            "approximate_count": self.count,
+        }
+
+
+class KeysetPaginator:
+    """
+    Cursor (keyset) pagination on a unique ordering, e.g. ('-date_creation', '-id')
+
+    A page is fetched with WHERE key < last key ... LIMIT n instead of OFFSET,
+    so deep pages cost the same as the first one. Page links are bounded to
+    `links` pages on each side of the current page; their cursors are found
+    with one key-only query per direction.
+
+    The last ordering field must be unique (the primary key) so the key is total.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-date_creation', '-id'), links=2, count=None):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.links = links
+        self.count = count
+
+    def _after(self, values, reverse=False):
+        """Q selecting the rows after `values` in the ordering (before them if reverse)"""
+        condition = Q()
+        for i, (field, value) in enumerate(zip(self.fields, values)):
+            descending = self.ordering[i].startswith('-') != reverse
+            step = Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+            for previous_field, previous_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{previous_field: previous_value})
+            condition |= step
+        return condition
+
+    def _key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def _parse_key(self, values):
+        """
+        Convert cursor values back to Python values of the ordering fields
+
+        Returns:
+            list: Parsed values, or None if the cursor does not fit the ordering
+        """
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            return None
+        parsed = []
+        for field_name, value in zip(self.fields, values):
+            if value is None or isinstance(value, (dict, list, bool)):
+                return None
+            try:
+                field = self.queryset.model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                # Annotation (e.g. search_score): only numbers are valid
+                if not isinstance(value, (int, float)):
+                    return None
+                parsed.append(value)
+                continue
+            try:
+                parsed.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                return None
+        return parsed
+
+    def get_page(self, cursor=None):
+        after, number = decode_cursor(cursor)
+        if after is not None:
+            after = self._parse_key(after)
+            if after is None:
+                logger.warning(f"Ignoring pagination cursor that does not match the ordering: {cursor!r}")
+        if after is None:
+            number = 1
+
+        rows = self.queryset if after is None else self.queryset.filter(self._after(after))
+        object_list = list(rows[:self.per_page + 1])
+        has_next = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        # Cursors of the following pages: keys after the current page
+        next_pages = []
+        if has_next:
+            last_key = self._key(object_list[-1])
+            next_pages.append((number + 1, encode_cursor(last_key, number + 1)))
+            if self.links > 1:
+                ahead = list(
+                    self.queryset.filter(self._after(last_key))
+                    .values_list(*self.fields)[:self.per_page * (self.links - 1) + 1]
+                )
+                for j in range(1, self.links):
+                    if len(ahead) <= self.per_page * j:
+                        break
+                    next_pages.append((number + 1 + j, encode_cursor(ahead[self.per_page * j - 1], number + 1 + j)))
+
+        # Cursors of the preceding pages: keys before the current page, nearest first
+        previous_pages = []
+        if after is not None and number > 1:
+            reverse_ordering = [
+                field[1:] if field.startswith('-') else f"-{field}" for field in self.ordering
+            ]
+            behind = list(
+                self.queryset.filter(self._after(after, reverse=True) | Q(**dict(zip(self.fields, after))))
+                .order_by(*reverse_ordering)
+                .values_list(*self.fields)[:self.per_page * self.links + 1]
+            )
+            for j in range(1, self.links + 1):
+                page_number = number - j
+                if page_number < 1 or len(behind) <= self.per_page * (j - 1):
+                    break
+                if page_number == 1 or len(behind) <= self.per_page * j:
+                    previous_pages.append((1, None))
+                    break
+                previous_pages.append((page_number, encode_cursor(behind[self.per_page * j], page_number)))
+
+        page_links = (
+            [{"number": n, "cursor": c, "current": False} for n, c in reversed(previous_pages)]
+            + [{"number": number, "cursor": cursor, "current": True}]
+            + [{"number": n, "cursor": c, "current": False} for n, c in next_pages]
+        )
+
+        return KeysetPage(
+            object_list,
+            number,
+            next_pages[0][1] if next_pages else None,
+            previous_pages[0][1] if previous_pages else None,
+            page_links,
+            self.count,
+            self.per_page,
+        )
@@ -1,24 +1,95 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import logging
+import threading
+import time
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+# Gateway responses that mean the RAG service itself is down or unreachable
+UNAVAILABLE_STATUS_CODES = {502, 503}
+
+
+class CircuitBreaker:
+    """
+    Track RAG service availability from the outcome of real requests
+    
+    closed     requests flow normally; `failure_threshold` consecutive
+               failures open the circuit
+    open       requests are refused (callers use the fallback) for
+               `reset_timeout` seconds
+    half_open  a single trial request is let through; its success closes
+               the circuit, its failure re-opens it
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+    
+    def allow_request(self):
+        """Return True if a request may be sent now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let exactly one caller probe the service (again, if a probe never reported back)
+                self.state = self.HALF_OPEN
+                self.opened_at = time.monotonic()
+                logger.info("RAG circuit half-open, probing service")
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("RAG circuit closed, service available again")
+            self.state = self.CLOSED
+            self.failures = 0
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"RAG circuit open after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
 class RAGClient:
-    """Client to communicate with the Flask RAG API"""
+    """Client to communicate with the RAG API gateway (main.py)"""
     
-    def __init__(self, base_url="http://localhost:5001"):
+    def __init__(self, base_url="http://localhost:5001", connect_timeout=3, read_timeout=30,
+                 failure_threshold=3, reset_timeout=30, pool_size=20):
         self.base_url = base_url
         self.submit_query_endpoint = f"{base_url}/submit_query"
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        
+        # Keep-alive connections shared by every request from this process
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
     
-    def get_response(self, user_message, user_id="default_user"):
+    def get_response(self, user_message, user_id="default_user", no_cache=False):
         """
         Send a query to the RAG system and get a response
         
         Args:
             user_message (str): The user's message/query
             user_id (str): Unique identifier for the user (for conversation history)
+            no_cache (bool): Bypass the answer caches and always query the LLM
             
         Returns:
             dict: Response from the RAG system
@@ -26,15 +97,21 @@ class RAGClient:
         try:
             payload = {
                 "query": user_message,
-                "user_id": user_id
+                "user_id": user_id,
+                "no_cache": no_cache
             }
             
-            response = requests.post(
+            response = self.session.post(
                 self.submit_query_endpoint,
                 json=payload,
-                timeout=30  # 30 seconds timeout
+                timeout=self.timeout
             )
             
+            if response.status_code in UNAVAILABLE_STATUS_CODES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            
             if response.status_code == 200:
                 return response.json()
             elif response.status_code == 504:
@@ -51,12 +128,14 @@ class RAGClient:
                 
         except requests.exceptions.Timeout:
             logger.error("RAG API request timed out")
+            self.breaker.record_failure()
             return {
                 "response": "Le système met trop de temps à répondre. Veuillez réessayer plus tard.",
                 "context": []
             }
         except requests.exceptions.ConnectionError:
             logger.error("Could not connect to RAG API")
+            self.breaker.record_failure()
             return {
                 "response": "Le service de chat n'est pas disponible actuellement. Veuillez réessayer plus tard.",
                 "context": []
@@ -68,15 +147,94 @@ class RAGClient:
                 "context": []
             }
     
+    def stream_response(self, user_message, user_id="default_user", no_cache=False):
+        """
+        Stream a response from the RAG system token by token
+        
+        Args:
+            user_message (str): The user's message/query
+            user_id (str): Unique identifier for the user (for conversation history)
+            no_cache (bool): Bypass the answer caches and always query the LLM
+            
+        Yields:
+            dict: {"type": "token", "content": ...} events, then one
+            {"type": "done", "response": ..., "context": [...]} event
+        """
+        try:
+            payload = {
+                "query": user_message,
+                "user_id": user_id,
+                "no_cache": no_cache
+            }
+            
+            with self.session.post(
+                f"{self.base_url}/stream_query",
+                json=payload,
+                stream=True,
+                timeout=self.timeout  # Read timeout applies between events
+            ) as response:
+                if response.status_code in UNAVAILABLE_STATUS_CODES:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                
+                if response.status_code != 200:
+                    logger.error(f"RAG API returned status code: {response.status_code}")
+                    yield {
+                        "type": "done",
+                        "response": "Une erreur s'est produite lors du traitement de votre demande.",
+                        "context": []
+                    }
+                    return
+                
+                for line in response.iter_lines(decode_unicode=True):
+                    if line and line.startswith("data: "):
+                        yield json.loads(line[len("data: "):])
+                
+        except requests.exceptions.Timeout:
+            logger.error("RAG API stream timed out")
+            self.breaker.record_failure()
+            yield {
+                "type": "done",
+                "response": "Le système met trop de temps à répondre. Veuillez réessayer plus tard.",
+                "context": []
+            }
+        except requests.exceptions.ConnectionError:
+            logger.error("Could not connect to RAG API")
+            self.breaker.record_failure()
+            yield {
+                "type": "done",
+                "response": "Le service de chat n'est pas disponible actuellement. Veuillez réessayer plus tard.",
+                "context": []
+            }
+        except Exception as e:
+            logger.error(f"Unexpected error in RAG client stream: {str(e)}")
+            yield {
+                "type": "done",
+                "response": "Une erreur inattendue s'est produite. Veuillez réessayer.",
+                "context": []
+            }
+    
     def is_available(self):
         """
         Check if the RAG service is available
         
+        Answered by the circuit breaker from recent request outcomes, without
+        a network round trip. Once the circuit has been open for
+        reset_timeout seconds this returns True for a single caller, whose
+        request then serves as the half-open probe.
+        
         Returns:
-            bool: True if service is available, False otherwise
+            bool: True if a request should be sent, False to use the fallback
         """
-        try:
-            response = requests.get(f"{self.base_url}/health", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
\ No newline at end of file
+        return self.breaker.allow_request()
+
+
+# Shared client: one keep-alive connection pool and breaker per Django process
+rag_client = RAGClient(
+    base_url=getattr(settings, 'RAG_API_URL', 'http://localhost:5001'),
+    connect_timeout=getattr(settings, 'RAG_API_CONNECT_TIMEOUT', 3),
+    read_timeout=getattr(settings, 'RAG_API_READ_TIMEOUT', 30),
+    failure_threshold=getattr(settings, 'RAG_BREAKER_FAILURE_THRESHOLD', 3),
+    reset_timeout=getattr(settings, 'RAG_BREAKER_RESET_TIMEOUT', 30),
+)
\ No newline at end of file
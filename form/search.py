@@ -0,0 +1,181 @@
+import logging
+import re
+from collections import Counter
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from entity_matcher import normalize_text
+from .models import InterventionSearchTerm
+
+logger = logging.getLogger(__name__)
+
+# Indexed fields and their weight in the relevance score
+SEARCH_FIELDS = {
+    'reference': 5,
+    'objet': 3,
+    'machine': 2,
+    'contact': 1,
+    'description': 1,
+}
+
+MAX_TERM_LENGTH = 64
+
+FRENCH_STOPWORDS = {
+    "au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "en", "et", "la", "le", "les",
+    "leur", "leurs", "mais", "ou", "par", "pas", "pour", "sa", "se", "ses", "son", "sur", "un",
+    "une", "est", "sont", "il", "elle", "ils", "elles", "qui", "que", "quoi", "ne", "plus",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    Split a French text into search terms
+
+    Accents and case are folded ('Défaut' -> 'defaut'), stopwords dropped and
+    plural 's' removed, so 'défauts' and 'defaut' give the same term.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(normalize_text(text or '')):
+        if token in FRENCH_STOPWORDS or (len(token) < 2 and not token.isdigit()):
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        terms.append(token[:MAX_TERM_LENGTH])
+    return terms
+
+
+def index_intervention(intervention):
+    """Rebuild the search terms of one intervention"""
+    weights = Counter()
+    for field, weight in SEARCH_FIELDS.items():
+        for term in tokenize(getattr(intervention, field)):
+            weights[term] += weight
+
+    rows = [
+        InterventionSearchTerm(term=term, intervention_id=intervention.pk, weight=weight)
+        for term, weight in weights.items()
+    ]
+    with transaction.atomic():
+        InterventionSearchTerm.objects.filter(intervention_id=intervention.pk).delete()
+        InterventionSearchTerm.objects.bulk_create(rows)
+
+
+def index_interventions(interventions, batch_size=1000):
+    """
+    Index interventions that have no search terms yet (bulk path, no per-row delete)
+
+    Returns:
+        int: Number of term rows written
+    """
+    rows = []
+    written = 0
+    for intervention in interventions:
+        weights = Counter()
+        for field, weight in SEARCH_FIELDS.items():
+            for term in tokenize(getattr(intervention, field)):
+                weights[term] += weight
+        rows.extend(
+            InterventionSearchTerm(term=term, intervention_id=intervention.pk, weight=weight)
+            for term, weight in weights.items()
+        )
+        if len(rows) >= batch_size:
+            InterventionSearchTerm.objects.bulk_create(rows)
+            written += len(rows)
+            rows = []
+    if rows:
+        InterventionSearchTerm.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+def _icontains_condition(query):
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f"{field}__icontains": query})
+    return condition
+
+
+def icontains_search(queryset, query):
+    """Substring search over the indexed fields (the original search)"""
+    return queryset.filter(_icontains_condition(query))
+
+
+def _fulltext_matches(query):
+    """
+    Interventions whose terms match the query, as (intervention_id, score) rows
+
+    Every query term must match, the last one as a prefix. Returns None if the
+    query has no searchable term.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return None
+
+    prefix = terms[-1]
+    exact = terms[:-1]
+
+    return (
+        InterventionSearchTerm.objects
+        .filter(Q(term__in=exact) | Q(term__startswith=prefix))
+        .values('intervention_id')
+        .annotate(
+            score=Sum('weight'),
+            exact_hits=Count('term', filter=Q(term__in=exact), distinct=True),
+            prefix_hit=Max(Case(
+                When(term__startswith=prefix, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )),
+        )
+        .filter(exact_hits=len(exact), prefix_hit=1)
+    )
+
+
+def fulltext_search(queryset, query):
+    """
+    Search the inverted index only
+
+    Returns:
+        QuerySet: Matches annotated with search_score, best first, or None
+            if the query has no searchable term
+    """
+    matches = _fulltext_matches(query)
+    if matches is None:
+        return None
+
+    return (
+        queryset
+        .filter(pk__in=matches.values('intervention_id'))
+        .annotate(search_score=Subquery(
+            matches.filter(intervention_id=OuterRef('pk')).values('score')[:1]
+        ))
+        .order_by('-search_score', '-date_creation')
+    )
+
+
+def search_interventions(queryset, query):
+    """
+    Filter interventions by a search query, most relevant first
+
+    Returns the union of the inverted-index and substring matches: rows
+    found by the index come first, ranked by search_score; rows only the
+    substring search finds (index not built yet, a fragment in the middle
+    of a word) follow with a score of 0. Queries without a searchable term
+    use the substring search alone.
+    """
+    matches = _fulltext_matches(query)
+    if matches is None:
+        return icontains_search(queryset, query)
+
+    return (
+        queryset
+        .filter(Q(pk__in=matches.values('intervention_id')) | _icontains_condition(query))
+        .annotate(search_score=Coalesce(
+            Subquery(matches.filter(intervention_id=OuterRef('pk')).values('score')[:1]),
+            Value(0),
+            output_field=IntegerField(),
+        ))
+        .order_by('-search_score', '-date_creation')
+    )
@@ -1,11 +1,26 @@
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from .models import InterventionRequest, Machine, Filiale
-from .chromadb_manager import chromadb_manager
+from .index_queue import schedule_index
+from .intervention_stats import adjust_intervention_stats
+from .search import index_intervention
+from .chat_entities import publish_chat_entities
 import logging
 
 logger = logging.getLogger(__name__)
 
+@receiver(pre_save, sender=InterventionRequest)
+def intervention_saving(sender, instance, **kwargs):
+    """
+    Signal handler run before an intervention is saved: remember its stored criticité
+    """
+    instance._previous_criticite = None
+    if instance.pk:
+        instance._previous_criticite = (
+            sender.objects.filter(pk=instance.pk).values_list('criticite', flat=True).first()
+        )
+
 @receiver(post_save, sender=InterventionRequest)
 def intervention_saved(sender, instance, created, **kwargs):
     """
@@ -27,21 +42,23 @@ def intervention_saved(sender, instance, created, **kwargs):
                 )
                 logger.info(f"Incremented counter for filiale: {instance.filiale_obj.name}")
         
-        # Handle ChromaDB embedding
+        # Adjust the cached dashboard statistics once the save is committed
+        previous = getattr(instance, '_previous_criticite', None)
         if created:
-            # New intervention created
-            success = chromadb_manager.embed_intervention(instance)
-            if success:
-                logger.info(f"New intervention {instance.reference} embedded in ChromaDB")
-            else:
-                logger.warning(f"Failed to embed new intervention {instance.reference}")
+            deltas = {'total': 1, instance.criticite: 1}
+        elif previous and previous != instance.criticite:
+            deltas = {previous: -1, instance.criticite: 1}
         else:
-            # Existing intervention updated
-            success = chromadb_manager.update_intervention(instance)
-            if success:
-                logger.info(f"Intervention {instance.reference} updated in ChromaDB")
-            else:
-                logger.warning(f"Failed to update intervention {instance.reference} in ChromaDB")
+            deltas = {}
+        if deltas:
+            transaction.on_commit(lambda: adjust_intervention_stats(deltas))
+        
+        # Keep the full-text search index in sync (same transaction as the save)
+        index_intervention(instance)
+        
+        # Handle ChromaDB embedding: queued after commit, written by run_chroma_indexer
+        schedule_index(instance)
+        logger.info(f"Intervention {instance.reference} queued for ChromaDB indexing")
                 
     except Exception as e:
         logger.error(f"Error in intervention_saved signal: {e}")
@@ -65,15 +82,35 @@ def intervention_deleted(sender, instance, **kwargs):
             )
             logger.info(f"Decremented counter for filiale: {instance.filiale_obj.name}")
         
-        # Handle ChromaDB deletion
-        success = chromadb_manager.delete_intervention(instance)
-        if success:
-            logger.info(f"Intervention {instance.reference} deleted from ChromaDB")
-        else:
-            logger.warning(f"Failed to delete intervention {instance.reference} from ChromaDB")
+        # Adjust the cached dashboard statistics once the deletion is committed
+        deltas = {'total': -1, instance.criticite: -1}
+        transaction.on_commit(lambda: adjust_intervention_stats(deltas))
+        
+        # Handle ChromaDB deletion: queued after commit, written by run_chroma_indexer
+        schedule_index(instance, action="delete")
+        logger.info(f"Intervention {instance.reference} queued for deletion from ChromaDB")
             
     except Exception as e:
         logger.error(f"Error in intervention_deleted signal: {e}")
 
+@receiver([post_save, post_delete], sender=Machine)
+@receiver([post_save, post_delete], sender=Filiale)
+def entity_names_changed(sender, instance, **kwargs):
+    """
+    Signal handler for when a machine or filiale is created, renamed or deleted
+    """
+    try:
+        # Keep the dashboard's machine / filiale counts in sync
+        field = 'machines' if sender is Machine else 'filiales'
+        if kwargs.get('signal') is post_delete:
+            transaction.on_commit(lambda: adjust_intervention_stats({field: -1}))
+        elif kwargs.get('created'):
+            transaction.on_commit(lambda: adjust_intervention_stats({field: 1}))
+        
+        # Keep the RAG worker's entity recognizer in sync with the tables
+        publish_chat_entities()
+    except Exception as e:
+        logger.error(f"Error in entity_names_changed signal: {e}")
+
 # Import models to avoid circular import
 from django.db import models
\ No newline at end of file
@@ -0,0 +1,165 @@
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from .chromadb_manager import chromadb_manager
+from .models import InterventionRequest, SimilarIntervention
+
+logger = logging.getLogger(__name__)
+
+# Neighbours stored per intervention, and the distance above which an
+# intervention is not considered similar (same cut-off the detail page used)
+SIMILAR_TOP_K = getattr(settings, 'SIMILAR_INTERVENTIONS_TOP_K', 5)
+SIMILAR_MAX_DISTANCE = 0.7
+
+# Interventions examined around a changed one when looking for lists it now belongs to
+CANDIDATES_FACTOR = 3
+
+
+def _doc_id(pk, reference):
+    return f"intervention_{reference}_{pk}"
+
+
+def _doc_pk(doc_id):
+    return int(doc_id.rsplit('_', 1)[1])
+
+
+def _stored_embedding(pk, reference):
+    """Return the embedding ChromaDB holds for an intervention, or None"""
+    result = chromadb_manager.collection.get(ids=[_doc_id(pk, reference)], include=["embeddings"])
+    embeddings = result.get("embeddings")
+    if not result["ids"] or embeddings is None or len(embeddings) == 0:
+        return None
+    return list(embeddings[0])
+
+
+def _nearest(embedding, n_results):
+    """Return [(pk, distance)] of the interventions closest to an embedding"""
+    results = chromadb_manager.collection.query(
+        query_embeddings=[embedding],
+        n_results=n_results,
+        where={"type": "intervention"},
+        include=["distances"],
+    )
+    return [(_doc_pk(doc_id), distance) for doc_id, distance in zip(results["ids"][0], results["distances"][0])]
+
+
+def _store_neighbours(pk, neighbours):
+    """Replace the stored neighbour list of an intervention"""
+    existing = set(
+        InterventionRequest.objects.filter(pk__in=[n for n, _ in neighbours]).values_list('pk', flat=True)
+    )
+    rows = [
+        SimilarIntervention(intervention_id=pk, similar_id=n, rank=rank, distance=distance)
+        for rank, (n, distance) in enumerate((n, d) for n, d in neighbours if n in existing)
+    ]
+    with transaction.atomic():
+        SimilarIntervention.objects.filter(intervention_id=pk).delete()
+        SimilarIntervention.objects.bulk_create(rows)
+
+
+def _recompute(pk, reference, embedding=None, candidates=None):
+    """
+    Recompute the neighbour list of one intervention from its stored embedding
+
+    Returns:
+        list: The [(pk, distance)] candidates found, nearest first
+    """
+    if candidates is None:
+        if embedding is None:
+            embedding = _stored_embedding(pk, reference)
+        if embedding is None:
+            return []
+        candidates = [(n, d) for n, d in _nearest(embedding, SIMILAR_TOP_K + 1) if n != pk]
+
+    neighbours = [(n, d) for n, d in candidates if d < SIMILAR_MAX_DISTANCE][:SIMILAR_TOP_K]
+    _store_neighbours(pk, neighbours)
+    return candidates
+
+
+def _recompute_many(pks):
+    for pk, reference in InterventionRequest.objects.filter(pk__in=pks).values_list('pk', 'reference'):
+        _recompute(pk, reference)
+
+
+def refresh_similar_interventions(intervention):
+    """
+    Refresh the neighbours of an intervention after it was embedded or re-embedded
+
+    The lists of other interventions are refreshed too when they may have
+    changed: those that listed this intervention before, and those it is now
+    closer to than their current last neighbour.
+    """
+    pk = intervention.pk
+    embedding = _stored_embedding(pk, intervention.reference)
+    if embedding is None:
+        return
+
+    candidates = [
+        (n, d) for n, d in _nearest(embedding, SIMILAR_TOP_K * CANDIDATES_FACTOR + 1) if n != pk
+    ]
+    _recompute(pk, intervention.reference, candidates=candidates)
+
+    affected = set(SimilarIntervention.objects.filter(similar_id=pk).values_list('intervention_id', flat=True))
+
+    close = {n: d for n, d in candidates if d < SIMILAR_MAX_DISTANCE}
+    lists = {
+        row['intervention_id']: (row['size'], row['worst'])
+        for row in SimilarIntervention.objects.filter(intervention_id__in=close)
+        .values('intervention_id').annotate(size=Count('id'), worst=Max('distance'))
+    }
+    for n, d in close.items():
+        size, worst = lists.get(n, (0, None))
+        if size < SIMILAR_TOP_K or d < worst:
+            affected.add(n)
+
+    _recompute_many(affected - {pk})
+
+
+def lists_to_repair_after_delete(pk, reference):
+    """
+    Return the interventions whose neighbour lists may need a replacement entry
+    once this intervention is removed from ChromaDB
+
+    Must be called before the ChromaDB document is deleted. The database rows
+    pointing at the intervention are already gone (cascade), so the affected
+    lists are found around its embedding.
+    """
+    embedding = _stored_embedding(pk, reference)
+    if embedding is None:
+        return set()
+    candidates = {n for n, d in _nearest(embedding, SIMILAR_TOP_K * CANDIDATES_FACTOR + 1) if n != pk}
+    full = set(
+        SimilarIntervention.objects.filter(intervention_id__in=candidates)
+        .values('intervention_id').annotate(size=Count('id')).filter(size__gte=SIMILAR_TOP_K)
+        .values_list('intervention_id', flat=True)
+    )
+    return candidates - full
+
+
+def repair_lists(pks):
+    """Recompute the neighbour lists returned by lists_to_repair_after_delete"""
+    _recompute_many(pks)
+
+
+def rebuild_similar_interventions(queryset, chunk_size=500):
+    """
+    Recompute every neighbour list of a queryset, without propagation
+
+    Returns:
+        int: Number of lists recomputed
+    """
+    count = 0
+    for rows in chromadb_manager._iter_keyset_chunks(queryset, chunk_size):
+        for pk, reference in rows:
+            _recompute(pk, reference)
+            count += 1
+    return count
+
+
+def get_similar_interventions(intervention, limit=3):
+    """Return the stored neighbours of an intervention, nearest first (one indexed query)"""
+    return list(
+        SimilarIntervention.objects.filter(intervention=intervention)
+        .select_related('similar').order_by('rank')[:limit]
+    )
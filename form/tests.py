@@ -1,3 +1,317 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import SkipTest, mock
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from entity_matcher import AhoCorasick, EntityMatcher, normalize_text
+from . import index_queue
+from .chat_entities import get_redis_client
+from .models import InterventionRequest
+from .pagination import KeysetPaginator, encode_cursor
+from .rag_client import CircuitBreaker
 
-# Create your tests here.
+
+class AhoCorasickTests(SimpleTestCase):
+    def test_finds_every_occurrence_with_positions(self):
+        automaton = AhoCorasick(["he", "she", "his", "hers"])
+        matches = sorted(automaton.iter_matches("ushers"))
+        self.assertEqual(matches, [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")])
+
+    def test_overlapping_patterns_share_a_prefix(self):
+        automaton = AhoCorasick(["four", "four a"])
+        matches = {pattern for _, _, pattern in automaton.iter_matches("four a vis")}
+        self.assertEqual(matches, {"four", "four a"})
+
+    def test_empty_patterns_are_ignored(self):
+        automaton = AhoCorasick(["", "ab"])
+        self.assertEqual(list(automaton.iter_matches("xab")), [(1, 3, "ab")])
+
+
+class EntityMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = EntityMatcher(
+            machines=["SNA", "Four", "Four à sole", "Presse 2"],
+            filiales=["Abattoir Dické", "Sud"],
+        )
+
+    def test_normalize_text_folds_case_and_accents(self):
+        self.assertEqual(normalize_text("Abattoir DICKÉ"), "abattoir dicke")
+
+    def test_accents_and_case_are_folded(self):
+        result = self.matcher.match("Panne à l'ABATTOIR DICKE")
+        self.assertEqual(result["filiales"], ["Abattoir Dické"])
+
+    def test_whole_words_only(self):
+        result = self.matcher.match("Distributeur de snacks au sud-ouest")
+        self.assertEqual(result["machines"], [])
+        # A hyphen is a word boundary
+        self.assertEqual(result["filiales"], ["Sud"])
+
+    def test_overlapping_names_are_all_returned_as_stored(self):
+        result = self.matcher.match("le four a sole est bloqué")
+        self.assertEqual(result["machines"], ["Four", "Four à sole"])
+
+    def test_each_name_is_returned_once(self):
+        result = self.matcher.match("SNA arrêtée, redémarrage de la SNA")
+        self.assertEqual(result["machines"], ["SNA"])
+
+    def test_name_with_digits_needs_a_boundary(self):
+        self.assertEqual(self.matcher.match("presse 2")["machines"], ["Presse 2"])
+        self.assertEqual(self.matcher.match("presse 21")["machines"], [])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('form.rag_client.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_stays_closed_below_the_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_success_resets_the_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_opens_after_consecutive_failures_and_refuses_requests(self):
+        self.open_breaker()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.now += 29
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_half_open_lets_a_single_probe_through(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_successful_probe_closes_the_circuit(self):
+        self.open_breaker()
+        self.now += 30
+        self.breaker.allow_request()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.failures, 0)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_probe_reopens_the_circuit(self):
+        self.open_breaker()
+        self.now += 30
+        self.breaker.allow_request()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.now += 29
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_lost_probe_is_retried_after_the_timeout(self):
+        self.open_breaker()
+        self.now += 30
+        self.breaker.allow_request()
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+
+
+class IndexQueueTests(SimpleTestCase):
+    """Run against the configured Redis, on test-only keys; skipped when Redis is down"""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            get_redis_client().ping()
+        except Exception as e:
+            raise SkipTest(f"Redis not available: {e}")
+        super().setUpClass()
+
+    def setUp(self):
+        settings = {
+            'INDEX_DEBOUNCE_SECONDS': 2,
+            'INDEX_DEBOUNCE_MAX_WAIT': 30,
+            'INDEX_MAX_ATTEMPTS': 3,
+            'INDEX_RETRY_BASE_DELAY': 5,
+        }
+        for name in ('INDEX_QUEUE_KEY', 'INDEX_PAYLOADS_KEY', 'INDEX_IN_FLIGHT_KEY',
+                     'INDEX_FAILED_KEY', 'INDEX_FIRST_QUEUED_KEY'):
+            settings[name] = f"test:{getattr(index_queue, name)}"
+        for name, value in settings.items():
+            patcher = mock.patch.object(index_queue, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.now = 1000.0
+        # Only the queue module's clock: the Redis client keeps the real one
+        patcher = mock.patch.object(index_queue, 'time', mock.Mock(time=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        keys = [value for name, value in settings.items() if name.endswith('_KEY')]
+        client = get_redis_client()
+        client.delete(*keys)
+        self.addCleanup(client.delete, *keys)
+
+    def claim_pks(self):
+        return sorted(job["pk"] for job in index_queue.claim_due_jobs())
+
+    def test_saves_of_one_intervention_are_coalesced(self):
+        index_queue.enqueue_index_job(7, "upsert", "R7")
+        self.now += 1
+        index_queue.enqueue_index_job(7, "delete", "R7")
+        self.now += 1
+        # The second save pushed the job back
+        self.assertEqual(index_queue.claim_due_jobs(), [])
+        self.now += 1
+        self.assertEqual(
+            index_queue.claim_due_jobs(),
+            [{"pk": 7, "action": "delete", "reference": "R7", "attempts": 0}],
+        )
+
+    def test_debounce_is_capped_by_max_wait(self):
+        while self.now < 1030:
+            index_queue.enqueue_index_job(7, "upsert", "R7")
+            self.now += 1
+        self.assertEqual(self.claim_pks(), [7])
+
+        # Claiming forgets when the job was first queued
+        index_queue.enqueue_index_job(7, "upsert", "R7")
+        self.now += 1
+        self.assertEqual(self.claim_pks(), [])
+        self.now += 1
+        self.assertEqual(self.claim_pks(), [7])
+
+    def test_claimed_job_stays_in_flight_until_completed(self):
+        index_queue.enqueue_index_job(7, "upsert", "R7")
+        self.now += 2
+        job, = index_queue.claim_due_jobs()
+        self.assertEqual(index_queue.get_queue_stats(), {"queued": 0, "in_flight": 1, "failed": 0})
+        index_queue.complete_job(job)
+        self.assertEqual(index_queue.get_queue_stats(), {"queued": 0, "in_flight": 0, "failed": 0})
+
+    def test_failed_job_is_retried_with_backoff(self):
+        index_queue.enqueue_index_job(7, "upsert", "R7")
+        self.now += 2
+        job, = index_queue.claim_due_jobs()
+        index_queue.retry_job(job, "boom")
+        self.assertEqual(index_queue.get_queue_stats(), {"queued": 1, "in_flight": 0, "failed": 0})
+        self.now += 4
+        self.assertEqual(index_queue.claim_due_jobs(), [])
+        self.now += 1
+        job, = index_queue.claim_due_jobs()
+        self.assertEqual(job["attempts"], 1)
+
+    def test_retry_does_not_override_a_newer_job(self):
+        index_queue.enqueue_index_job(7, "upsert", "R7")
+        self.now += 2
+        job, = index_queue.claim_due_jobs()
+        index_queue.enqueue_index_job(7, "delete", "R7")
+        index_queue.retry_job(job, "boom")
+        self.now += 2
+        job, = index_queue.claim_due_jobs()
+        self.assertEqual((job["action"], job["attempts"]), ("delete", 0))
+
+    def test_job_is_parked_after_max_attempts(self):
+        index_queue.retry_job({"pk": 7, "action": "upsert", "reference": "R7", "attempts": 2}, "boom")
+        self.assertEqual(index_queue.get_queue_stats(), {"queued": 0, "in_flight": 0, "failed": 1})
+        failed = json.loads(get_redis_client().lindex(index_queue.INDEX_FAILED_KEY, 0))
+        self.assertEqual((failed["attempts"], failed["error"]), (3, "boom"))
+
+    def test_requeue_in_flight_puts_back_unconfirmed_jobs(self):
+        index_queue.enqueue_index_job(7, "upsert", "R7")
+        index_queue.enqueue_index_job(8, "delete", "R8")
+        self.now += 2
+        self.assertEqual(self.claim_pks(), [7, 8])
+        self.assertEqual(index_queue.requeue_in_flight(), 2)
+        self.assertEqual(index_queue.get_queue_stats(), {"queued": 2, "in_flight": 0, "failed": 0})
+        self.assertEqual(self.claim_pks(), [7, 8])
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        # bulk_create: no signals, so nothing is queued for ChromaDB
+        InterventionRequest.objects.bulk_create(
+            InterventionRequest(reference=f"PAGE-{i:02d}", date_intervention=now, objet=f"Intervention {i}")
+            for i in range(25)
+        )
+        # Two rows per creation date, so the id must break the ties
+        for i, pk in enumerate(InterventionRequest.objects.order_by('pk').values_list('pk', flat=True)):
+            InterventionRequest.objects.filter(pk=pk).update(date_creation=now - timedelta(minutes=i // 2))
+        cls.expected = list(
+            InterventionRequest.objects.order_by('-date_creation', '-id').values_list('pk', flat=True)
+        )
+
+    def get_page(self, cursor=None):
+        return KeysetPaginator(InterventionRequest.objects.all(), 10).get_page(cursor)
+
+    def pks(self, page):
+        return [intervention.pk for intervention in page]
+
+    def test_first_page(self):
+        page = self.get_page()
+        self.assertEqual(page.number, 1)
+        self.assertEqual(self.pks(page), self.expected[:10])
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+
+    def test_next_cursors_visit_every_row_once_in_order(self):
+        page = self.get_page()
+        seen = self.pks(page)
+        numbers = [page.number]
+        while page.has_next():
+            page = self.get_page(page.next_cursor)
+            seen += self.pks(page)
+            numbers.append(page.number)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(numbers, [1, 2, 3])
+
+    def test_page_links_lead_back_to_previous_pages(self):
+        page = self.get_page(self.get_page(self.get_page().next_cursor).next_cursor)
+        self.assertEqual(self.pks(page), self.expected[20:])
+        links = {link["number"]: link["cursor"] for link in page.page_links}
+        self.assertEqual(sorted(links), [1, 2, 3])
+        self.assertIsNone(links[1])
+        self.assertEqual(page.previous_cursor, links[2])
+
+        previous = self.get_page(page.previous_cursor)
+        self.assertEqual(previous.number, 2)
+        self.assertEqual(self.pks(previous), self.expected[10:20])
+        self.assertTrue(previous.has_previous())
+
+    def test_json_listing_follows_cursors(self):
+        seen = []
+        params = {}
+        while True:
+            data = self.client.get(reverse('interventions_api'), params).json()
+            seen += [row["id"] for row in data["results"]]
+            if not data["pagination"]["has_next"]:
+                break
+            params = {'cursor': data["pagination"]["next_cursor"]}
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(data["pagination"]["page"], 3)
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        cursors = [
+            "not a cursor",
+            encode_cursor(["notadate", 5], 3),
+            encode_cursor([{"a": 1}, 5], 3),
+            encode_cursor([None, 5], 3),
+            encode_cursor([5], 3),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                page = self.get_page(cursor)
+                self.assertEqual(page.number, 1)
+                self.assertEqual(self.pks(page), self.expected[:10])
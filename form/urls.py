@@ -11,6 +11,7 @@ urlpatterns = [
     path('rapport/pdf/', views.generate_pdf_report, name='generate_pdf_report'),
     path('intervention/<int:pk>/pdf/', views.generate_intervention_pdf, name='generate_intervention_pdf'),
     path('api/chatbot/', views.chatbot_api, name='chatbot_api'),
+    path('api/interventions/', views.interventions_api, name='interventions_api'),
     path('api/extract-pdf/', views.extract_pdf_data, name='extract_pdf_data'),
     path('api/create-from-pdf/', views.create_intervention_from_pdf, name='create_intervention_from_pdf'),
     path('powerbi/', views.powerbi_dashboard, name='powerbi_dashboard'),
@@ -9,6 +9,7 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from django.http import HttpResponse
 from django.utils import timezone
 from .models import InterventionRequest,Technician
+from .intervention_stats import criticite_breakdown
 
 import io
 import os
@@ -94,7 +95,9 @@ def generate_interventions_pdf(interventions, filters=None):
     # Informations du rapport
     date_generation = timezone.now().strftime("%d/%m/%Y à %H:%M")
     info_text = f"<b>Date de génération :</b> {date_generation}<br/>"
-    info_text += f"<b>Nombre d'interventions :</b> {interventions.count()}<br/>"
+    # Statistiques par criticité (une seule requête d'agrégation)
+    breakdown = criticite_breakdown(interventions)
+    info_text += f"<b>Nombre d'interventions :</b> {breakdown['total']}<br/>"
     
     if filters:
         info_text += "<b>Filtres appliqués :</b><br/>"
@@ -114,11 +117,11 @@ def generate_interventions_pdf(interventions, filters=None):
     story.append(stats_title)
     
     # Calculer les statistiques
-    total = interventions.count()
-    faible = interventions.filter(criticite='faible').count()
-    moyenne = interventions.filter(criticite='moyenne').count()
-    haute = interventions.filter(criticite='haute').count()
-    critique = interventions.filter(criticite='critique').count()
+    total = breakdown['total']
+    faible = breakdown['faible']
+    moyenne = breakdown['moyenne']
+    haute = breakdown['haute']
+    critique = breakdown['critique']
     
     # Tableau des statistiques
     stats_data = [
@@ -1,12 +1,11 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
+from urllib.parse import urlencode
 from .utils import normalize_intervenants
 import logging
 import tempfile
@@ -15,77 +14,107 @@ import requests
 from .models import InterventionRequest, DocumentIntervention, Machine, Filiale
 from .forms import InterventionRequestForm, DocumentInterventionForm
 from .utils import generate_interventions_pdf, generate_detailed_intervention_pdf
-from .rag_client import RAGClient
+from .rag_client import rag_client
 from .chromadb_manager import chromadb_manager
+from .index_queue import schedule_index
+from .similar_interventions import get_similar_interventions
+from .intervention_stats import get_intervention_stats
+from .search import search_interventions
+from .pagination import KeysetPaginator, cached_count
+from .chat_entities import get_entity_matcher, record_entity_queries
 from . import pdf_extractor
 from django.conf import settings
 from .powerbi_embed import powerbi_service
 logger = logging.getLogger(__name__)
 
-def dashboard(request):
-    """Vue du tableau de bord"""
-    # Statistiques
-    total_interventions = InterventionRequest.objects.count()
-    faible = InterventionRequest.objects.filter(criticite='faible').count()
-    moyenne = InterventionRequest.objects.filter(criticite='moyenne').count()
-    haute = InterventionRequest.objects.filter(criticite='haute').count()
-    critique = InterventionRequest.objects.filter(criticite='critique').count()
+def filter_interventions(interventions, search_query, criticite_filter, filiale_filter, machine_filter):
+    """Applique les filtres du tableau de bord (aussi utilisés par le rapport PDF)"""
+    if search_query:
+        interventions = search_interventions(interventions, search_query)
+    
+    if criticite_filter != 'all':
+        interventions = interventions.filter(criticite=criticite_filter)
     
-    # Statistiques des machines et filiales
-    total_machines = Machine.objects.count()
-    total_filiales = Filiale.objects.count()
+    # Filtrer par clé étrangère : le nom (unique) est d'abord résolu en id, pour que
+    # les index composites (filiale_obj / machine_obj, date_creation, id) pilotent la requête
+    if filiale_filter != 'all':
+        filiale_id = Filiale.objects.filter(name=filiale_filter).values_list('id', flat=True).first()
+        interventions = interventions.filter(filiale_obj_id=filiale_id) if filiale_id else interventions.none()
     
-    # Filtres
+    if machine_filter != 'all':
+        machine_id = Machine.objects.filter(name=machine_filter).values_list('id', flat=True).first()
+        interventions = interventions.filter(machine_obj_id=machine_id) if machine_id else interventions.none()
+    
+    return interventions
+
+
+def paginate_interventions(request, total=None):
+    """
+    Filtre les interventions selon les paramètres GET et renvoie la page du curseur demandé
+    
+    Args:
+        request: Requête portant search, criticite, filiale, machine et cursor
+        total (int): Nombre total d'interventions s'il est déjà connu
+    
+    Returns:
+        tuple: (KeysetPage, dict des filtres actifs)
+    """
     search_query = request.GET.get('search', '')
     criticite_filter = request.GET.get('criticite', 'all')
     filiale_filter = request.GET.get('filiale', 'all')
     machine_filter = request.GET.get('machine', 'all')
     
-    # Requête de base
-    interventions = InterventionRequest.objects.all()
-    
-    # Appliquer les filtres
-    if search_query:
-        interventions = interventions.filter(
-            Q(reference__icontains=search_query) |
-            Q(objet__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(contact__icontains=search_query) |
-            Q(machine__icontains=search_query)
-        )
+    interventions = filter_interventions(
+        InterventionRequest.objects.all(), search_query, criticite_filter, filiale_filter, machine_filter
+    )
     
-    if criticite_filter != 'all':
-        interventions = interventions.filter(criticite=criticite_filter)
+    # Pagination par curseur sur (date_creation, id) : pas de COUNT(*) ni d'OFFSET à chaque page
+    filter_params = {
+        'search': search_query,
+        'criticite': criticite_filter,
+        'filiale': filiale_filter,
+        'machine': machine_filter,
+    }
+    active_filters = {key: value for key, value in filter_params.items() if value and value != 'all'}
+    if active_filters:
+        total_count = cached_count(interventions, active_filters)
+    else:
+        total_count = total if total is not None else get_intervention_stats()['total']
     
-    if filiale_filter != 'all':
-        interventions = interventions.filter(filiale=filiale_filter)
+    if 'search_score' in interventions.query.annotations:
+        ordering = ('-search_score', '-date_creation', '-id')
+    else:
+        ordering = ('-date_creation', '-id')
+    paginator = KeysetPaginator(interventions, 10, ordering=ordering, count=total_count)
+    return paginator.get_page(request.GET.get('cursor')), active_filters
+
+
+def dashboard(request):
+    """Vue du tableau de bord"""
+    # Statistiques (cache tenu à jour par les signaux)
+    stats = get_intervention_stats()
     
-    if machine_filter != 'all':
-        interventions = interventions.filter(machine=machine_filter)
+    # Filtres
+    search_query = request.GET.get('search', '')
+    criticite_filter = request.GET.get('criticite', 'all')
+    filiale_filter = request.GET.get('filiale', 'all')
+    machine_filter = request.GET.get('machine', 'all')
     
     # Obtenir les filiales et machines pour les filtres
-    filiales = Filiale.objects.values_list('name', flat=True).distinct()
-    machines = Machine.objects.values_list('name', flat=True).distinct()
+    # (noms uniques : pas besoin de DISTINCT)
+    filiales = Filiale.objects.values_list('name', flat=True)
+    machines = Machine.objects.values_list('name', flat=True)
     
-    # Pagination
-    paginator = Paginator(interventions, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Interventions filtrées, paginées par curseur
+    page_obj, active_filters = paginate_interventions(request, total=stats['total'])
     
     # Get ChromaDB stats for dashboard
     chromadb_stats = chromadb_manager.get_collection_stats()
     
     context = {
-        'stats': {
-            'total': total_interventions,
-            'faible': faible,
-            'moyenne': moyenne,
-            'haute': haute,
-            'critique': critique,
-            'machines': total_machines,
-            'filiales': total_filiales,
-        },
+        'stats': stats,
         'page_obj': page_obj,
+        'filter_query': urlencode(active_filters),
         'search_query': search_query,
         'criticite_filter': criticite_filter,
         'filiale_filter': filiale_filter,
@@ -99,6 +128,28 @@ def dashboard(request):
     return render(request, 'form/dashboard.html', context)
 
 
+@require_http_methods(["GET"])
+def interventions_api(request):
+    """Liste JSON des interventions : mêmes filtres que le tableau de bord, pagination par `cursor`"""
+    page_obj, _ = paginate_interventions(request)
+    return JsonResponse({
+        'results': [
+            {
+                'id': intervention.pk,
+                'reference': intervention.reference,
+                'date_intervention': intervention.date_intervention.isoformat(),
+                'date_creation': intervention.date_creation.isoformat(),
+                'objet': intervention.objet,
+                'machine': intervention.machine,
+                'filiale': intervention.filiale,
+                'criticite': intervention.criticite,
+            }
+            for intervention in page_obj
+        ],
+        'pagination': page_obj.to_dict(),
+    })
+
+
 def nouvelle_intervention(request):
     """Vue pour créer une nouvelle intervention"""
     if request.method == 'POST':
@@ -113,10 +164,8 @@ def nouvelle_intervention(request):
             intervention.save()
             messages.success(request, f'Intervention {intervention.reference} créée avec succès!')
             
-            # The intervention will be automatically embedded via Django signals
-            # Check if embedding was successful
-            if chromadb_manager.is_available():
-                messages.info(request, 'Intervention ajoutée à la base de connaissances IA.')
+            # The intervention is queued for ChromaDB by the signals (run_chroma_indexer writes it)
+            messages.info(request, 'Indexation dans la base de connaissances IA programmée.')
             
             return redirect('dashboard')
         else:
@@ -153,9 +202,8 @@ def modifier_intervention(request, pk):
             intervention.save()
             messages.success(request, f'Intervention {intervention.reference} modifiée avec succès!')
             
-            # The intervention will be automatically updated in ChromaDB via Django signals
-            if chromadb_manager.is_available():
-                messages.info(request, 'Base de connaissances IA mise à jour.')
+            # The intervention is queued for ChromaDB by the signals (run_chroma_indexer writes it)
+            messages.info(request, 'Mise à jour de la base de connaissances IA programmée.')
             
             return redirect('detail_intervention', pk=pk)
         else:
@@ -185,19 +233,13 @@ def chatbot_api(request):
         data = json.loads(request.body)
         user_message = data.get('message', '').strip()
         user_id = data.get('user_id', 'default_user')
-        machines = Machine.objects.all()
-        filiales = Filiale.objects.all()
-
-        for machine in machines:
-            if machine.name.lower() in user_message.lower():
-                machine.query_counter += 1
-                machine.save()
-                print(f"Matched and incremented: {machine.name}") 
-        for filiale in filiales:
-            if filiale.name.lower() in user_message.lower():
-                filiale.query_counter += 1
-                filiale.save()
-                print(f"Matched and incremented: {filiale.name}")             
+        no_cache = bool(data.get('no_cache', False))
+
+        # Count mentions of known machines and filiales (buffered, flushed in bulk)
+        entities = get_entity_matcher().match(user_message)
+        record_entity_queries(entities)
+        if entities['machines'] or entities['filiales']:
+            logger.info(f"Matched entities: {entities}")
         if not user_message:
             return JsonResponse({
                 'success': False,
@@ -261,16 +303,17 @@ def chatbot_api(request):
                     'context': []
                 })
         
-        # Initialize RAG client for general queries
-        rag_client = RAGClient()
-        
-        # Check if RAG service is available
+        # Check if RAG service is available (circuit breaker, no network call)
         if not rag_client.is_available():
             # Fallback to simple responses if RAG is not available
             return get_fallback_response(user_message)
         
+        # Relay tokens as they are generated when the widget asks for it
+        if data.get('stream'):
+            return stream_chatbot_response(rag_client, user_message, user_id, no_cache)
+        
         # Get response from RAG system
-        rag_response = rag_client.get_response(user_message, user_id)
+        rag_response = rag_client.get_response(user_message, user_id, no_cache=no_cache)
         
         # Extract response text
         response_text = rag_response.get('response', 'Désolé, je n\'ai pas pu traiter votre demande.')
@@ -300,9 +343,33 @@ def chatbot_api(request):
         })
 
 
+def stream_chatbot_response(rag_client, user_message, user_id, no_cache=False):
+    """Relay the RAG token stream to the widget as Server-Sent Events"""
+    def events():
+        for event in rag_client.stream_response(user_message, user_id, no_cache=no_cache):
+            if event.get('type') == 'done':
+                # Final event carries the same fields as the JSON response
+                response_text = event.get('response', 'Désolé, je n\'ai pas pu traiter votre demande.')
+                context = event.get('context', [])
+                event = {
+                    'type': 'done',
+                    'success': True,
+                    'response': response_text,
+                    'actions': determine_ui_actions(user_message, response_text),
+                    'context': context[:3] if context else []
+                }
+            yield f"data: {json.dumps(event)}\n\n"
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def get_fallback_response(user_message):
     """Fallback responses when RAG system is not available"""
     user_message_lower = user_message.lower()
+    stats = get_intervention_stats()
     
     fallback_responses = {
         'nouvelle intervention': {
@@ -318,7 +385,7 @@ def get_fallback_response(user_message):
             'actions': [{'type': 'highlight', 'selector': 'a[href*="generate_pdf_report"]'}]
         },
         'statistiques': {
-            'text': f'Voici les statistiques actuelles : {InterventionRequest.objects.count()} interventions au total, dont {InterventionRequest.objects.filter(criticite="critique").count()} critiques.',
+            'text': f'Voici les statistiques actuelles : {stats["total"]} interventions au total, dont {stats["critique"]} critiques.',
             'actions': []
         },
         'aide': {
@@ -371,25 +438,9 @@ def generate_pdf_report(request):
     machine_filter = request.GET.get('machine', 'all')
     
     # Appliquer les mêmes filtres
-    interventions = InterventionRequest.objects.all()
-    
-    if search_query:
-        interventions = interventions.filter(
-            Q(reference__icontains=search_query) |
-            Q(objet__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(contact__icontains=search_query) |
-            Q(machine__icontains=search_query)
-        )
-    
-    if criticite_filter != 'all':
-        interventions = interventions.filter(criticite=criticite_filter)
-    
-    if filiale_filter != 'all':
-        interventions = interventions.filter(filiale=filiale_filter)
-    
-    if machine_filter != 'all':
-        interventions = interventions.filter(machine=machine_filter)
+    interventions = filter_interventions(
+        InterventionRequest.objects.all(), search_query, criticite_filter, filiale_filter, machine_filter
+    )
     
     # Préparer les informations de filtres pour le PDF
     filters = {
@@ -430,28 +481,21 @@ def detail_intervention(request, pk):
     intervention = get_object_or_404(InterventionRequest, pk=pk)
     documents = intervention.documents.all()
     
-    # Get similar interventions from ChromaDB
-    similar_interventions = []
-    if chromadb_manager.is_available():
-        query_text = f"{intervention.objet} {intervention.description} {intervention.machine}"
-        similar_results = chromadb_manager.search_similar_interventions(query_text, n_results=5)
-        
-        if similar_results['documents'] and similar_results['documents'][0]:
-            for metadata, distance in zip(similar_results['metadatas'][0], similar_results['distances'][0]):
-                if (metadata.get('type') == 'intervention' and 
-                    metadata.get('reference') != intervention.reference and
-                    distance < 0.7):  # Only show reasonably similar interventions
-                    similar_interventions.append({
-                        'reference': metadata.get('reference'),
-                        'machine': metadata.get('machine'),
-                        'criticite': metadata.get('criticite'),
-                        'similarity': (1-distance)*100
-                    })
+    # Similar interventions, precomputed by the ChromaDB indexer
+    similar_interventions = [
+        {
+            'reference': link.similar.reference,
+            'machine': link.similar.machine,
+            'criticite': link.similar.criticite,
+            'similarity': (1 - link.distance) * 100,
+        }
+        for link in get_similar_interventions(intervention, limit=3)
+    ]
     
     context = {
         'intervention': intervention,
         'documents': documents,
-        'similar_interventions': similar_interventions[:3],  # Show top 3 similar
+        'similar_interventions': similar_interventions,
     }
     
     return render(request, 'form/detail_intervention.html', context)
@@ -466,9 +510,8 @@ def supprimer_intervention(request, pk):
         intervention.delete()
         messages.success(request, f'Intervention {reference} supprimée avec succès!')
         
-        # The intervention will be automatically removed from ChromaDB via Django signals
-        if chromadb_manager.is_available():
-            messages.info(request, 'Intervention supprimée de la base de connaissances IA.')
+        # The removal is queued for ChromaDB by the signals (run_chroma_indexer applies it)
+        messages.info(request, 'Suppression de la base de connaissances IA programmée.')
         
         return redirect('dashboard')
     
@@ -523,9 +566,9 @@ def upload_document(request, pk):
                     logger.error(f"Error extracting PDF data: {e}")
                     # Continue with normal upload even if extraction fails
             
-            # Update the intervention in ChromaDB to include the new document
-            if chromadb_manager.is_available():
-                chromadb_manager.update_intervention(intervention)
+            # Reindex the intervention to include the new document
+            # (coalesced with the job queued by intervention.save() above, if any)
+            schedule_index(intervention)
             
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': True, 'message': 'Document uploadé avec succès!'})
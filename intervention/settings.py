@@ -141,6 +141,35 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # ChromaDB Configuration
 CHROMADB_PATH = BASE_DIR / 'chroma_data'
+# Initialize ChromaDB when a web worker boots (wsgi.py / asgi.py) instead of on first use
+CHROMADB_WARM_UP = False
+# Seconds the dashboard's ChromaDB document counts are cached
+CHROMADB_STATS_CACHE_TTL = 60
+
+# Shared embedding service (embedding_server.py); falls back to an in-process model
+EMBEDDING_SERVICE_URL = 'http://127.0.0.1:5002'
+# Backend for the in-process fallback: 'torch', 'onnx' or 'int8' (see embedding_backends.py)
+EMBEDDING_BACKEND = 'torch'
+
+# Redis shared with the RAG gateway (main.py) and worker (worker.py)
+REDIS_URL = 'redis://localhost:6379/0'
+
+# Cache shared by every Django process (dashboard statistics, ChromaDB counts)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+}
+# Safety-net TTL of the dashboard counters, which signals otherwise keep up to date
+INTERVENTION_STATS_CACHE_TTL = 3600
+
+# RAG gateway client (form/rag_client.py)
+RAG_API_URL = 'http://localhost:5001'
+RAG_API_CONNECT_TIMEOUT = 3
+RAG_API_READ_TIMEOUT = 30
+RAG_BREAKER_FAILURE_THRESHOLD = 3  # consecutive failures before falling back
+RAG_BREAKER_RESET_TIMEOUT = 30  # seconds before a half-open probe
 
 # Logging configuration
 LOGGING = {
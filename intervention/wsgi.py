@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intervention.settings')
 
 application = get_wsgi_application()
+
+# Open ChromaDB and the embedding client before the first request rather than during it
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'CHROMADB_WARM_UP', False):
+    from form.chromadb_manager import chromadb_manager  # noqa: E402
+    chromadb_manager.warm_up()
@@ -0,0 +1,60 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Redis key holding the knowledge-base version. ChromaDBManager increments it
+# on every add, update or delete; every answer/retrieval cache key includes it,
+# so entries written against an older knowledge base are simply never read
+# again and age out with their TTL.
+KB_VERSION_KEY = "kb_version"
+
+# Redis counters of intervention encodes, shared by every process writing to
+# ChromaDB (indexer, bulk commands): "performed" encodes vs. "skipped" ones
+# whose intervention text had not changed.
+EMBED_COUNTS_PREFIX = "chroma_embeds"
+EMBED_OUTCOMES = ("performed", "skipped")
+
+
+def get_kb_version(redis_client):
+    """Return the current knowledge-base version (0 if unknown)"""
+    if not redis_client:
+        return 0
+    try:
+        return int(redis_client.get(KB_VERSION_KEY) or 0)
+    except Exception as e:
+        logger.error(f"Failed to read knowledge-base version: {e}")
+        return 0
+
+
+def bump_kb_version(redis_client):
+    """Increment the knowledge-base version and return the new value"""
+    if not redis_client:
+        return None
+    try:
+        return redis_client.incr(KB_VERSION_KEY)
+    except Exception as e:
+        logger.error(f"Failed to bump knowledge-base version: {e}")
+        return None
+
+
+def count_embeds(redis_client, outcome, n=1):
+    """Add `n` to the embed counter of an outcome ("performed" or "skipped")"""
+    if not redis_client or not n:
+        return
+    try:
+        redis_client.incrby(f"{EMBED_COUNTS_PREFIX}:{outcome}", n)
+    except Exception as e:
+        logger.error(f"Failed to count embeds: {e}")
+
+
+def get_embed_counts(redis_client):
+    """Return the embed counters, e.g. {"performed": 120, "skipped": 30} (zeros if unknown)"""
+    counts = dict.fromkeys(EMBED_OUTCOMES, 0)
+    if not redis_client:
+        return counts
+    try:
+        values = redis_client.mget([f"{EMBED_COUNTS_PREFIX}:{outcome}" for outcome in EMBED_OUTCOMES])
+        return {outcome: int(value or 0) for outcome, value in zip(EMBED_OUTCOMES, values)}
+    except Exception as e:
+        logger.error(f"Failed to read embed counters: {e}")
+        return counts
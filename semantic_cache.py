@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """
+    In-memory answer cache keyed on query embeddings.
+
+    A stored answer is served again when a new query's cosine similarity to
+    the cached query reaches `threshold` and the knowledge-base chunks
+    retrieved for both queries are the same. Entries are evicted least
+    recently used first once `max_entries` is reached, and expire after
+    `ttl` seconds. Entries stored under another knowledge-base version or
+    another conversation state are never served.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=1000, ttl=3600, log_every=100):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.log_every = log_every
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_key = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def get(self, embedding, context_ids, kb_version=0, history_digest=""):
+        """
+        Return the cached response for a similar query, or None
+
+        Args:
+            embedding: Query embedding
+            context_ids (list): IDs of the chunks retrieved for the query
+            kb_version (int): Current knowledge-base version
+            history_digest (str): Digest of the conversation so far
+        """
+        vector = self._normalize(embedding)
+        context_ids = tuple(context_ids)
+
+        with self._lock:
+            self._expire(time.monotonic())
+
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry["context_ids"] == context_ids
+                and entry["kb_version"] == kb_version
+                and entry["history_digest"] == history_digest
+            ]
+            best_key, best_score = None, -1.0
+            if candidates:
+                matrix = np.stack([entry["vector"] for _, entry in candidates])
+                scores = matrix @ vector
+                index = int(np.argmax(scores))
+                best_key, best_score = candidates[index][0], float(scores[index])
+
+            if best_key is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_key)
+                self.hits += 1
+                response = self._entries[best_key]["response"]
+            else:
+                self.misses += 1
+                response = None
+
+            lookups = self.hits + self.misses
+            if self.log_every and lookups % self.log_every == 0:
+                logger.info(f"Semantic cache: {self.stats()}")
+
+        return response
+
+    def set(self, embedding, context_ids, response, kb_version=0, history_digest=""):
+        """Store the response generated for a query"""
+        with self._lock:
+            self._entries[self._next_key] = {
+                "vector": self._normalize(embedding),
+                "context_ids": tuple(context_ids),
+                "kb_version": kb_version,
+                "history_digest": history_digest,
+                "response": response,
+                "created_at": time.monotonic(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -4,7 +4,6 @@ from mistralai.client import MistralClient
 from mistralai import Mistral
 from chromadb import PersistentClient
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 import requests
 import os
 from openai import OpenAI
@@ -13,6 +12,16 @@ from azure.ai.inference.models import SystemMessage, UserMessage
 from azure.core.credentials import AzureKeyCredential
 import redis
 import logging
+import re
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from embedding_batcher import EmbeddingBatcher
+from embedding_client import EmbeddingClient, DEFAULT_EMBEDDING_SERVICE_URL
+from embedding_backends import load_embedding_model
+from semantic_cache import SemanticCache
+from kb_version import get_kb_version
+from cache_keys import retrieval_cache_key, history_digest
+from entity_matcher import EntityMatcher, ENTITIES_KEY, ENTITIES_VERSION_KEY
 # from form.models import Machine
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -27,30 +36,72 @@ except Exception as e:
     logger.error(f"Redis connection failed: {e}")
     redis_client = None
 
-# Initialize ChromaDB and SentenceTransformer
-try:
-    client = PersistentClient(
-        path="../chroma_data",
-        settings=Settings(anonymized_telemetry=False),
-    )
-    collection = client.get_collection("pdf_knowledge_base")
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    logger.info("ChromaDB and SentenceTransformer initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing ChromaDB or SentenceTransformer: {e}")
-    raise
+# Concurrency settings
+# WORKER_CONCURRENCY: queries in flight per process (prefetch count and thread pool size)
+# WORKER_PROCESSES: consumer processes forked from this one
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", "8"))
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", "1"))
+# EMBED_BATCH_WINDOW_MS: how long concurrent query embeddings are collected into one batch (0 disables)
+# EMBED_BATCH_SIZE: maximum number of queries per batch
+EMBED_BATCH_WINDOW_MS = float(os.environ.get("EMBED_BATCH_WINDOW_MS", "10"))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "32"))
 
-# Initialize RabbitMQ connection
-try:
-    connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
-    channel = connection.channel()
-    
-    channel.queue_declare(queue="query_queue")
-    channel.queue_declare(queue="response_queue")
-    logger.info("RabbitMQ connection established successfully")
-except Exception as e:
-    logger.error(f"Error connecting to RabbitMQ: {e}")
-    raise
+# Semantic answer cache settings
+# SEMANTIC_CACHE_THRESHOLD: minimum cosine similarity between two queries to reuse an answer
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", "1000"))
+SEMANTIC_CACHE_TTL = int(os.environ.get("SEMANTIC_CACHE_TTL", "3600"))
+
+# Shared retrieval cache TTL; keys carry the knowledge-base version, so this can be long
+RETRIEVAL_CACHE_TTL = int(os.environ.get("RETRIEVAL_CACHE_TTL", str(24 * 3600)))
+
+# Entity pre-filtering: a filtered search returning fewer hits than this falls back to the full collection
+ENTITY_FILTER_MIN_HITS = int(os.environ.get("ENTITY_FILTER_MIN_HITS", "3"))
+# Context slots given to the filtered intervention hits; the rest come from the unfiltered search
+ENTITY_FILTER_SLOTS = int(os.environ.get("ENTITY_FILTER_SLOTS", "6"))
+RETRIEVAL_TOP_K = 10
+
+# EMBEDDING_SERVICE_URL: shared embedding service; set it empty to load the model in this process
+EMBEDDING_SERVICE_URL = os.environ.get("EMBEDDING_SERVICE_URL", DEFAULT_EMBEDDING_SERVICE_URL)
+# EMBEDDING_BACKEND: torch, onnx or int8 for in-process encoding (see embedding_backends.py)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+
+if EMBEDDING_SERVICE_URL:
+    model = EmbeddingClient(EMBEDDING_SERVICE_URL, model_name="all-MiniLM-L6-v2", backend=EMBEDDING_BACKEND)
+    logger.info(f"Using embedding service at {EMBEDDING_SERVICE_URL}")
+else:
+    # Load the SentenceTransformer before any fork so children share it copy-on-write
+    try:
+        model = load_embedding_model("all-MiniLM-L6-v2", EMBEDDING_BACKEND)
+        logger.info("SentenceTransformer initialized successfully")
+    except Exception as e:
+        logger.error(f"Error initializing SentenceTransformer: {e}")
+        raise
+
+embedding_batcher = EmbeddingBatcher(model, window_ms=EMBED_BATCH_WINDOW_MS, max_batch_size=EMBED_BATCH_SIZE)
+
+semantic_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    max_entries=SEMANTIC_CACHE_SIZE,
+    ttl=SEMANTIC_CACHE_TTL,
+)
+
+# ChromaDB is opened per process in init_chromadb(); its SQLite handles must not cross a fork
+collection = None
+
+def init_chromadb():
+    """Open the knowledge base collection for the current process"""
+    global collection
+    try:
+        client = PersistentClient(
+            path="../chroma_data",
+            settings=Settings(anonymized_telemetry=False),
+        )
+        collection = client.get_collection("pdf_knowledge_base")
+        logger.info("ChromaDB initialized successfully")
+    except Exception as e:
+        logger.error(f"Error initializing ChromaDB: {e}")
+        raise
 
 #######################################################################################################
 # GitHub Models Configuration
@@ -65,7 +116,9 @@ clients = OpenAI(
     api_key=GITHUB_TOKEN,
 )
 
-def generate_response(user_query, context_text, history=None):
+LLM_ERROR_MESSAGE = "Désolé, je ne peux pas générer une réponse pour le moment. Veuillez réessayer plus tard."
+
+def generate_response(user_query, context_text, history=None, on_delta=None):
     """
     Generate a response using the OpenAI API with context and conversation history
     
@@ -73,6 +126,8 @@ def generate_response(user_query, context_text, history=None):
         user_query (str): The user's question
         context_text (str): Relevant context from the knowledge base
         history (list): Previous conversation history
+        on_delta (callable): If given, the completion is streamed and each
+            text delta is passed to it as soon as it arrives
         
     Returns:
         str: Generated response
@@ -134,20 +189,211 @@ RÉPONSE :"""
             messages.append({"role": "assistant", "content": msg["content"]})
 
     try:
-        response = clients.chat.completions.create(
-            model=modele,  
+        if on_delta is None:
+            response = clients.chat.completions.create(
+                model=modele,  
+                messages=messages,
+                max_tokens=500,  # Limit response length
+                temperature=0.7,  # Balanced creativity
+            )
+            return response.choices[0].message.content
+
+        # Stream the completion and forward each delta as it arrives
+        stream = clients.chat.completions.create(
+            model=modele,
             messages=messages,
-            max_tokens=500,  # Limit response length
-            temperature=0.7,  # Balanced creativity
+            max_tokens=500,
+            temperature=0.7,
+            stream=True,
         )
-        return response.choices[0].message.content
+        parts = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+        return "".join(parts)
     except Exception as e:
         logger.error(f"Error with OpenAI API: {e}")
-        return "Désolé, je ne peux pas générer une réponse pour le moment. Veuillez réessayer plus tard."
+        return LLM_ERROR_MESSAGE
+
+# Machine/filiale recognizer, rebuilt when Django publishes a new name list
+entity_matcher = EntityMatcher()
+entity_version = None
+
+YEAR_PATTERN = re.compile(r"\b(?:19|20)\d{2}\b")
+
+def refresh_entity_matcher():
+    """Rebuild the entity matcher if the published names changed"""
+    global entity_matcher, entity_version
+    if not redis_client:
+        return
+    try:
+        version = redis_client.get(ENTITIES_VERSION_KEY)
+        if version == entity_version:
+            return
+        payload = json.loads(redis_client.get(ENTITIES_KEY) or "{}")
+        entity_matcher = EntityMatcher(payload.get("machines", []), payload.get("filiales", []))
+        entity_version = version
+        logger.info(f"Entity matcher rebuilt with {len(payload.get('machines', []))} machines and {len(payload.get('filiales', []))} filiales")
+    except Exception as e:
+        logger.error(f"Failed to refresh entity matcher: {e}")
+
+def build_metadata_filter(user_query):
+    """
+    Turn the machines, filiales and years named in a query into a Chroma where filter
+
+    Only intervention documents carry machine/filiale metadata, so the filter
+    is restricted to them (their year is stored as an int).
+
+    Returns:
+        dict or None: None when the query names nothing we can filter on
+    """
+    refresh_entity_matcher()
+    entities = entity_matcher.match(user_query)
+    years = sorted({int(year) for year in YEAR_PATTERN.findall(user_query)})
+
+    clauses = []
+    for field, values in (("machine", entities["machines"]), ("filiale", entities["filiales"]), ("year", years)):
+        if len(values) == 1:
+            clauses.append({field: values[0]})
+        elif values:
+            clauses.append({field: {"$in": values}})
+
+    if not clauses:
+        return None
+    return {"$and": [{"type": "intervention"}] + clauses}
+
+def merge_results(filtered, unfiltered, filtered_slots, top_k):
+    """
+    Combine filtered intervention hits with the unfiltered top-k
+
+    The first `filtered_slots` filtered hits come first, then the unfiltered
+    hits (PDF chunks included) fill the remaining slots, without duplicates.
+
+    Returns:
+        dict: Results with the shape of collection.query output
+    """
+    fields = ("ids", "documents", "metadatas", "distances")
+    merged = {field: [] for field in fields}
+    seen = set()
+    for results, limit in ((filtered, filtered_slots), (unfiltered, top_k)):
+        for i, doc_id in enumerate(results["ids"][0][:limit]):
+            if doc_id in seen or len(merged["ids"]) >= top_k:
+                continue
+            seen.add(doc_id)
+            for field in fields:
+                merged[field].append(results[field][0][i])
+    return {field: [values] for field, values in merged.items()}
+
+def retrieve_context(user_query, kb_version):
+    """
+    Embed the query and fetch its top-k chunks, through the shared retrieval cache
+
+    The cache entry is independent of the user: it holds the query embedding
+    and the IDs/distances of the hits, so a repeated question from any
+    technician skips both the encode and the vector search and only fetches
+    the chunks by ID.
+
+    When the query names a known machine, filiale or year, matching
+    interventions are searched separately and given the first
+    ENTITY_FILTER_SLOTS slots; the unfiltered search fills the rest, so PDF
+    and manual chunks stay in the context. The filtered hits are dropped if
+    there are fewer than ENTITY_FILTER_MIN_HITS of them.
+
+    Returns:
+        tuple: (query_embedding, results) where results has the shape of
+        collection.query output
+    """
+    where = build_metadata_filter(user_query)
+    cache_key = retrieval_cache_key(user_query, kb_version, where)
+
+    if redis_client:
+        cached = redis_client.get(cache_key)
+        if cached:
+            entry = json.loads(cached)
+            fetched = collection.get(ids=entry["ids"], include=["documents", "metadatas"])
+            chunks = dict(zip(fetched["ids"], zip(fetched["documents"], fetched["metadatas"])))
+            if all(doc_id in chunks for doc_id in entry["ids"]):
+                logger.info("Retrieval cache hit")
+                return entry["embedding"], {
+                    "ids": [entry["ids"]],
+                    "documents": [[chunks[doc_id][0] for doc_id in entry["ids"]]],
+                    "metadatas": [[chunks[doc_id][1] for doc_id in entry["ids"]]],
+                    "distances": [entry["distances"]],
+                }
+
+    # Generate query embedding, batched with other in-flight queries
+    query_embedding = embedding_batcher.encode(user_query).tolist()
+
+    # Query the whole knowledge base
+    results = collection.query(
+        query_embedding, 
+        include=["documents", "metadatas", "distances"], 
+        n_results=RETRIEVAL_TOP_K
+    )
+
+    # Put the interventions matching the named entities first
+    if where:
+        filtered = collection.query(
+            query_embedding,
+            include=["documents", "metadatas", "distances"],
+            n_results=RETRIEVAL_TOP_K,
+            where=where,
+        )
+        if len(filtered["ids"][0]) < ENTITY_FILTER_MIN_HITS:
+            logger.info(f"Filter {where} matched {len(filtered['ids'][0])} chunks, using the full search only")
+        else:
+            results = merge_results(filtered, results, ENTITY_FILTER_SLOTS, RETRIEVAL_TOP_K)
+
+    if redis_client and results["ids"]:
+        redis_client.setex(cache_key, RETRIEVAL_CACHE_TTL, json.dumps({
+            "embedding": query_embedding,
+            "ids": results["ids"][0],
+            "distances": results["distances"][0],
+        }))
+
+    return query_embedding, results
+
+def send_reply(ch, properties, response_data, stream_channel=None):
+    """
+    Deliver the final response to whoever is waiting for it
+
+    Streaming clients get a "done" event on their Redis channel; the RabbitMQ
+    reply is only published when the request carries a reply_to queue.
+    """
+    if stream_channel and redis_client:
+        redis_client.publish(stream_channel, json.dumps({"type": "done", **response_data}))
+
+    if properties.reply_to:
+        ch.basic_publish(
+            exchange="",
+            routing_key=properties.reply_to,
+            properties=pika.BasicProperties(correlation_id=properties.correlation_id),
+            body=json.dumps(response_data),
+        )
+
+def finish_message(ch, method, properties, response_data, stream_channel=None):
+    """
+    Reply and ack from a pool thread
+
+    pika channels are not thread-safe, so the publish and the ack are
+    scheduled on the connection's I/O thread.
+    """
+    def reply_and_ack():
+        send_reply(ch, properties, response_data, stream_channel)
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    ch.connection.add_callback_threadsafe(reply_and_ack)
 
 def process_query(ch, method, properties, body):
     """
     Process incoming queries from RabbitMQ
+
+    Runs on a pool thread, so the embedding, Redis and LLM calls never block
+    the connection's heartbeats.
     
     Args:
         ch: Channel
@@ -155,34 +401,45 @@ def process_query(ch, method, properties, body):
         properties: Properties
         body: Message body containing the query
     """
+    stream_channel = None
     try:
         request_data = json.loads(body)
         user_query = request_data.get("query")
         
 
         user_id = request_data.get("user_id", "default_user")
+
+        # Per-request opt-out of every answer cache
+        no_cache = bool(request_data.get("no_cache"))
+
+        # Streaming requests name a Redis pub/sub channel for LLM deltas
+        stream_channel = request_data.get("stream_channel")
+        stream = bool(stream_channel and redis_client)
+
+        def _publish_delta(delta):
+            redis_client.publish(stream_channel, json.dumps({"type": "token", "content": delta}))
         
         logger.info(f"Processing query from user {user_id}: {user_query[:100]}...")
         
-        # Generate query embedding
-        query_embedding = model.encode(user_query).tolist()
+        # Knowledge-base version the cached entries must have been built against
+        kb_version = get_kb_version(redis_client)
+        
+        # Embed the query and search the knowledge base (shared retrieval cache)
+        query_embedding, results = retrieve_context(user_query, kb_version)
         
         # Get conversation history from Redis
         history = []
+        history_json = None
         if redis_client:
             history_key = f"chat_history:{user_id}"
             history_json = redis_client.get(history_key)
             history = json.loads(history_json) if history_json else []
         
+        # Answers are only reusable within the same conversation state
+        conversation = history_digest(history_json)
+        
         # Add current user message to history
         history.append({"role": "user", "content": user_query})
-        
-        # Query the knowledge base
-        results = collection.query(
-            query_embedding, 
-            include=["documents", "metadatas", "distances"], 
-            n_results=10
-        )
 
         response_data = {"response": "No relevant documents found", "context": []}
 
@@ -191,13 +448,15 @@ def process_query(ch, method, properties, body):
             top_matches = sorted(
                 [
                     {
+                        "id": doc_id,
                         "text": doc,
                         "source": meta.get("source", "Document inconnu"),
                         "page": meta.get("page"),
                         "year": meta.get("year"),
                         "similarity": dist,
                     }
-                    for doc, meta, dist in zip(
+                    for doc_id, doc, meta, dist in zip(
+                        results["ids"][0],
                         results["documents"][0],
                         results["metadatas"][0],
                         results["distances"][0],
@@ -209,8 +468,19 @@ def process_query(ch, method, properties, body):
             # Prepare context text
             context_text = "\n\n".join([match["text"] for match in top_matches])
             
-            # Generate response using the AI model
-            response = generate_response(user_query, context_text, history)
+            # Reuse the answer to a near-identical query over the same chunks
+            context_ids = [match["id"] for match in top_matches]
+            response = None if no_cache else semantic_cache.get(query_embedding, context_ids, kb_version, conversation)
+            
+            if response is not None:
+                logger.info(f"Semantic cache hit for user {user_id}")
+            else:
+                # Generate response using the AI model
+                response = generate_response(
+                    user_query, context_text, history, on_delta=_publish_delta if stream else None
+                )
+                if not no_cache and response != LLM_ERROR_MESSAGE:
+                    semantic_cache.set(query_embedding, context_ids, response, kb_version, conversation)
             
             # Append assistant response to history
             history.append({"role": "assistant", "content": response})
@@ -238,7 +508,12 @@ def process_query(ch, method, properties, body):
         else:
             logger.warning(f"No relevant documents found for query: {user_query[:100]}...")
             # Still add to history and generate a general response
-            general_response = generate_response(user_query, "Aucun document spécifique trouvé dans la base de connaissances.", history)
+            general_response = generate_response(
+                user_query,
+                "Aucun document spécifique trouvé dans la base de connaissances.",
+                history,
+                on_delta=_publish_delta if stream else None,
+            )
             history.append({"role": "assistant", "content": general_response})
             
             if redis_client:
@@ -250,47 +525,47 @@ def process_query(ch, method, properties, body):
                 "context": []
             }
 
-        # Send response back via RabbitMQ
-        ch.basic_publish(
-            exchange="",
-            routing_key=properties.reply_to,
-            properties=pika.BasicProperties(correlation_id=properties.correlation_id),
-            body=json.dumps(response_data),
-        )
-        
-        # Acknowledge the message
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        # Send response back via RabbitMQ (and the stream channel, if any), then ack
+        finish_message(ch, method, properties, response_data, stream_channel)
         
     except json.JSONDecodeError as e:
         logger.error(f"Error decoding JSON: {e}")
         error_response = {"response": "Erreur de format de requête", "context": []}
-        ch.basic_publish(
-            exchange="",
-            routing_key=properties.reply_to,
-            properties=pika.BasicProperties(correlation_id=properties.correlation_id),
-            body=json.dumps(error_response),
-        )
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        finish_message(ch, method, properties, error_response, stream_channel)
         
     except Exception as e:
         logger.error(f"Error processing query: {e}")
         error_response = {"response": "Une erreur s'est produite lors du traitement de votre demande", "context": []}
-        ch.basic_publish(
-            exchange="",
-            routing_key=properties.reply_to,
-            properties=pika.BasicProperties(correlation_id=properties.correlation_id),
-            body=json.dumps(error_response),
-        )
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        finish_message(ch, method, properties, error_response, stream_channel)
+
+def run_consumer():
+    """Consume query_queue with WORKER_CONCURRENCY queries in flight"""
+    init_chromadb()
+
+    # Initialize RabbitMQ connection
+    try:
+        connection = pika.BlockingConnection(pika.ConnectionParameters("localhost", heartbeat=60))
+        channel = connection.channel()
+        
+        channel.queue_declare(queue="query_queue")
+        channel.queue_declare(queue="response_queue")
+        logger.info("RabbitMQ connection established successfully")
+    except Exception as e:
+        logger.error(f"Error connecting to RabbitMQ: {e}")
+        raise
+
+    executor = ThreadPoolExecutor(max_workers=WORKER_CONCURRENCY, thread_name_prefix="rag-query")
+
+    def on_message(ch, method, properties, body):
+        executor.submit(process_query, ch, method, properties, body)
 
-def main():
-    """Main function to start the worker"""
     try:
-        # Set up the consumer
-        channel.basic_consume(queue="query_queue", on_message_callback=process_query)
+        # Let RabbitMQ deliver up to WORKER_CONCURRENCY unacked queries at once
+        channel.basic_qos(prefetch_count=WORKER_CONCURRENCY)
+        channel.basic_consume(queue="query_queue", on_message_callback=on_message)
         
-        logger.info("🚀 RAG Worker is waiting for messages in query_queue. To exit, press CTRL+C")
-        print("🚀 RAG Worker is waiting for messages in query_queue. To exit, press CTRL+C")
+        logger.info(f"🚀 RAG Worker (pid {os.getpid()}, {WORKER_CONCURRENCY} concurrent queries) is waiting for messages in query_queue. To exit, press CTRL+C")
+        print(f"🚀 RAG Worker (pid {os.getpid()}, {WORKER_CONCURRENCY} concurrent queries) is waiting for messages in query_queue. To exit, press CTRL+C")
         
         # Start consuming messages
         channel.start_consuming()
@@ -299,14 +574,45 @@ def main():
         logger.info("Worker stopped by user")
         print("\n👋 Worker stopped by user")
         channel.stop_consuming()
-        connection.close()
     except Exception as e:
         logger.error(f"Error in main worker loop: {e}")
         print(f"❌ Error in main worker loop: {e}")
     finally:
+        # Unacked in-flight messages are requeued by RabbitMQ once the connection closes
+        executor.shutdown(wait=False, cancel_futures=True)
         if connection.is_open:
             connection.close()
             logger.info("RabbitMQ connection closed")
 
+def main():
+    """Main function to start the worker"""
+    if WORKER_PROCESSES <= 1:
+        run_consumer()
+        return
+
+    # Fork so every child shares the already-loaded model pages copy-on-write.
+    # With the embedding service, this process holds no model: the service keeps
+    # the only copy. If the service is down now, the children would each load the
+    # fallback model, so it is loaded here first and shared instead.
+    if EMBEDDING_SERVICE_URL and not model.service_available():
+        logger.warning("Embedding service unavailable at startup, preloading the fallback model before forking")
+        model.preload_local_model()
+
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=run_consumer, name=f"rag-worker-{i}") for i in range(WORKER_PROCESSES)]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {WORKER_PROCESSES} worker processes")
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping worker processes")
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file